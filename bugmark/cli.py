@@ -1,7 +1,11 @@
 import argparse
 import sys
 import json
+import re
+import time
+from pathlib import Path
 from .core import BugmarkCore
+from .storage import open_store, merge_stores
 from .constants import Severity, Status
 
 def main():
@@ -29,6 +33,10 @@ def main():
     list_parser.add_argument("--sort", choices=["date", "severity", "status", "file"], default="date", help="Sort bugs")
     list_parser.add_argument("--filter", help="Use a saved filter")
 
+    # Bugs At
+    at_parser = subparsers.add_parser("at", help="Show bugs anchored in a file, line range or directory")
+    at_parser.add_argument("location", help="File or directory path, optionally suffixed with :line or :start-end")
+
     # Save Filter
     sf_parser = subparsers.add_parser("save-filter", help="Save current list filters")
     sf_parser.add_argument("name", help="Filter name")
@@ -37,6 +45,17 @@ def main():
     sf_parser.add_argument("--status", help="Status to save")
     sf_parser.add_argument("--severity", help="Severity to save")
 
+    # Watch Filter
+    watch_parser = subparsers.add_parser("watch", help="Show bugs that entered or left a saved filter since the last run")
+    watch_parser.add_argument("name", help="Saved filter name")
+    watch_parser.add_argument("--follow", action="store_true", help="Keep polling for changes")
+    watch_parser.add_argument("--interval", type=float, default=2.0, help="Polling interval in seconds for --follow")
+
+    # Dedupe
+    dedupe_parser = subparsers.add_parser("dedupe", help="Find clusters of near-duplicate bugs and offer to merge them")
+    dedupe_parser.add_argument("--yes", action="store_true", help="Merge every cluster without asking")
+    dedupe_parser.add_argument("--dry-run", action="store_true", help="Only list clusters")
+
     # Resolve Bug
     resolve_parser = subparsers.add_parser("resolve", help="Mark a bug as resolved")
     resolve_parser.add_argument("id", help="Bug ID to resolve")
@@ -67,6 +86,21 @@ def main():
     # Git Hooks
     subparsers.add_parser("install-hooks", help="Install Git hooks for bug linking")
 
+    # Compact
+    compact_parser = subparsers.add_parser("compact", help="Fold old bug history into summaries and rewrite the store")
+    compact_parser.add_argument("--days", type=int, help="Keep history newer than this many days (default from config)")
+    compact_parser.add_argument("--keep-last", type=int, help="Always keep this many newest history items per bug")
+    compact_parser.add_argument("--encoding", choices=["pretty", "compact"], help="JSON store encoding to write")
+    compact_parser.add_argument("--compression", choices=["none", "gzip", "zstd"], help="Compression for the JSON store")
+
+    # Link Commits
+    link_parser = subparsers.add_parser("link-commits", help="Index new commits and link them to referenced bugs")
+    link_parser.add_argument("--quiet", action="store_true", help="Suppress output")
+
+    # Reanchor
+    reanchor_parser = subparsers.add_parser("reanchor", help="Remap bug file:line anchors through git changes since they were recorded")
+    reanchor_parser.add_argument("--dry-run", action="store_true", help="Show remapped anchors without saving")
+
     # Scan TODOs
     scan_parser = subparsers.add_parser("scan", help="Scan project for TODO/FIXME comments")
     scan_parser.add_argument("--add", action="store_true", help="Auto-add found TODOs as bugs")
@@ -74,17 +108,45 @@ def main():
     # Stats
     subparsers.add_parser("stats", help="Show bug statistics and ASCII charts")
 
+    # Trends
+    trends_parser = subparsers.add_parser("trends", help="Show open-bug trends, burndown and time to resolve")
+    trends_parser.add_argument("--days", type=int, default=30, help="Number of days to show")
+    trends_parser.add_argument("--severity", choices=[s.value for s in Severity], help="Only count bugs of this severity")
+    trends_parser.add_argument("--owner", help="Only count bugs owned by this user")
+
     # CI Check
     ci_parser = subparsers.add_parser("ci-check", help="Fail if critical bugs are found")
     ci_parser.add_argument("--threshold", choices=[s.value for s in Severity], default=Severity.CRITICAL.value, help="Severity threshold")
 
+    # Merge
+    merge_parser = subparsers.add_parser("merge", help="Merge another bug store into this one, per bug and per field")
+    merge_parser.add_argument("other", help="Path to the other bugs.json or bugs.db")
+    merge_parser.add_argument("--base", help="Common ancestor store, enables detecting deletions")
+
+    # Git merge driver
+    driver_parser = subparsers.add_parser("merge-driver", help="Git merge driver entry point (%%O %%A %%B)")
+    driver_parser.add_argument("base", help="Common ancestor version")
+    driver_parser.add_argument("ours", help="Our version; the merge result is written here")
+    driver_parser.add_argument("theirs", help="Their version")
+
     # Sync
     subparsers.add_parser("sync", help="Sync bugs with Git (pull)")
 
     args = parser.parse_args()
+
+    if args.command == "merge-driver":
+        # Runs on git's temporary files, independent of the configured store
+        ours = open_store(Path(args.ours))
+        theirs = open_store(Path(args.theirs))
+        if ours is None or theirs is None:
+            sys.exit(1)
+        merge_stores(ours, theirs, open_store(Path(args.base)))
+        sys.exit(0)
+
     core = BugmarkCore()
 
     if args.command == "add":
+        duplicates = core.find_duplicates(args.desc, args.file, args.line)
         bug_id = core.add_bug(
             desc=args.desc,
             file=args.file,
@@ -95,29 +157,39 @@ def main():
             due_date=args.due
         )
         print(f"Bug {bug_id} added.")
+        if duplicates:
+            print("Warning: possible duplicates:")
+            for bug, score in duplicates:
+                print(f"  [{bug.bug_id}] {bug.desc} ({bug.file}:{bug.line}) - {bug.status} (similarity {score:.2f})")
 
     elif args.command == "list":
         filters = {}
+        overridden = args.tag or args.file or args.status or args.severity
+        bugs = None
         if args.filter:
             saved = core.get_filter(args.filter)
-            if saved:
+            if saved is None:
+                print(f"Filter '{args.filter}' not found.")
+            elif not overridden:
                 filters = saved
+                bugs = core.view_bugs(args.filter, search=args.search, sort_by=args.sort)
             else:
-                print(f"Filter '{args.filter}' not found.")
+                filters = saved
         
         tag = args.tag or filters.get("tag")
         file = args.file or filters.get("file")
         status = args.status or filters.get("status")
         severity = args.severity or filters.get("severity")
 
-        bugs = core.list_bugs(
-            tag=tag, 
-            file=file, 
-            status=status, 
-            severity=severity,
-            search=args.search,
-            sort_by=args.sort
-        )
+        if bugs is None:
+            bugs = core.query_bugs(
+                tag=tag, 
+                file=file, 
+                status=status, 
+                severity=severity,
+                search=args.search,
+                sort_by=args.sort
+            )
         
         if not bugs:
             print("No matching bugs found.")
@@ -128,6 +200,19 @@ def main():
                 stale_tag = " [STALE]" if bug.is_stale else ""
                 print(f"[{bug.bug_id}] {bug.desc} ({bug.file}:{bug.line}) [{', '.join(bug.tags)}] - {bug.status} ({bug.severity}){stale_tag}")
 
+    elif args.command == "at":
+        path, start_line, end_line = args.location, None, None
+        match = re.match(r"^(.+):(\d+)(?:-(\d+))?$", args.location)
+        if match:
+            path, start_line = match.group(1), int(match.group(2))
+            end_line = int(match.group(3)) if match.group(3) else start_line
+        bugs = core.bugs_at(path, start_line, end_line)
+        if not bugs:
+            print("No bugs found at this location.")
+        else:
+            for bug in bugs:
+                print(f"[{bug.bug_id}] {bug.file}:{bug.line} {bug.desc} - {bug.status} ({bug.severity})")
+
     elif args.command == "save-filter":
         filters = {
             "tag": args.tag,
@@ -139,6 +224,38 @@ def main():
         core.save_filter(args.name, filters)
         print(f"Filter '{args.name}' saved.")
 
+    elif args.command == "watch":
+        while True:
+            changes = core.watch_filter(args.name)
+            if changes is None:
+                print(f"Filter '{args.name}' not found.")
+                sys.exit(1)
+            added, removed = changes
+            for bug in core.storage.get_bugs(added):
+                print(f"+ [{bug.bug_id}] {bug.desc} ({bug.file}:{bug.line}) - {bug.status} ({bug.severity})")
+            for bug_id in removed:
+                print(f"- [{bug_id}]")
+            if not args.follow:
+                if not added and not removed:
+                    print("No changes.")
+                break
+            time.sleep(args.interval)
+
+    elif args.command == "dedupe":
+        clusters = core.find_duplicate_clusters()
+        if not clusters:
+            print("No duplicate clusters found.")
+        interactive = sys.stdin.isatty() and not args.yes and not args.dry_run
+        for cluster in clusters:
+            print("\nCluster:")
+            for bug in sorted(cluster, key=lambda b: b.created):
+                print(f"  [{bug.bug_id}] {bug.desc} ({bug.file}:{bug.line}) - {bug.status}")
+            if args.dry_run:
+                continue
+            if args.yes or (interactive and input("Merge this cluster? [y/N] ").strip().lower() == "y"):
+                primary = core.merge_duplicates(cluster)
+                print(f"Merged into bug {primary}.")
+
     elif args.command == "resolve":
         if core.resolve_bug(args.id):
             print(f"Bug {args.id} marked as resolved.")
@@ -180,7 +297,17 @@ def main():
             if bug.history:
                 print("\nHistory:")
                 for h in bug.history:
-                    print(f"  - [{h.timestamp}] {h.user} changed {h.field}: {h.old_value} -> {h.new_value}")
+                    if h.field == "summary":
+                        fields = ", ".join(sorted(h.new_value["fields"]))
+                        print(f"  - [{h.new_value['first']} .. {h.new_value['last']}] {h.new_value['count']} older changes to {fields}")
+                    else:
+                        print(f"  - [{h.timestamp}] {h.user} changed {h.field}: {h.old_value} -> {h.new_value}")
+
+            commits = core.get_bug_commits(bug.bug_id)
+            if commits:
+                print("\nCommits:")
+                for c in commits:
+                    print(f"  - {c['sha'][:10]} [{c['action']}] {c['author']}: {c['summary']}")
 
     elif args.command == "export":
         core.export_all(args.format, args.output)
@@ -193,6 +320,38 @@ def main():
     elif args.command == "install-hooks":
         success, msg = core.install_hooks()
         print(msg)
+        if not success:
+            sys.exit(1)
+
+    elif args.command == "compact":
+        try:
+            result = core.compact(days=args.days, keep_last=args.keep_last,
+                                  encoding=args.encoding, compression=args.compression)
+        except RuntimeError as e:
+            print(e)
+            sys.exit(1)
+        print(f"Folded {result['folded']} history items across {result['bugs']} bugs.")
+        print(f"Store size: {result['size_before']} -> {result['size_after']} bytes")
+
+    elif args.command == "link-commits":
+        success, msg = core.index_commits()
+        if not args.quiet:
+            print(msg)
+        if not success:
+            sys.exit(1)
+
+    elif args.command == "reanchor":
+        success, msg, changes = core.reanchor_bugs(dry_run=args.dry_run)
+        for change in changes:
+            if change.get("error"):
+                print(f"[{change['bug_id']}] {change['file']}:{change['old_line']} -> not remapped ({change['error']})")
+            elif change["new_line"] is None:
+                print(f"[{change['bug_id']}] {change['file']}:{change['old_line']} -> line deleted (tagged anchor-lost)")
+            else:
+                print(f"[{change['bug_id']}] {change['file']}:{change['old_line']} -> {change['new_file']}:{change['new_line']}")
+        print(msg)
+        if not success:
+            sys.exit(1)
 
     elif args.command == "scan":
         todos = core.scan_todos(auto_add=args.add)
@@ -200,20 +359,37 @@ def main():
             print("No TODOs or FIXMEs found.")
         else:
             for todo in todos:
-                prefix = "[ADDED] " if args.add else ""
+                if "duplicate_of" in todo:
+                    prefix = f"[DUPLICATE of {todo['duplicate_of']}] "
+                else:
+                    prefix = "[ADDED] " if args.add else ""
                 print(f"{prefix}{todo['type']}: {todo['desc']} ({todo['file']}:{todo['line']})")
 
     elif args.command == "stats":
         print(core.get_ascii_report())
 
+    elif args.command == "trends":
+        if args.days < 1:
+            print("--days must be at least 1.")
+            sys.exit(1)
+        print(core.get_trends_report(days=args.days, severity=args.severity, owner=args.owner))
+
     elif args.command == "ci-check":
-        bugs = core.list_bugs(severity=args.threshold, status=Status.OPEN)
+        bugs = core.query_bugs(severity=args.threshold, status=Status.OPEN)
         if bugs:
             print(f"CI Check FAILED: Found {len(bugs)} {args.threshold} bugs.")
             sys.exit(1)
         else:
             print("CI Check PASSED.")
 
+    elif args.command == "merge":
+        stats = core.merge_store(args.other, args.base)
+        if stats is None:
+            print(f"Store '{args.other}' not found or empty.")
+            sys.exit(1)
+        print(f"Merged {args.other}: {stats['added']} added, {stats['updated']} updated, "
+              f"{stats['deleted']} deleted, {stats['unchanged']} unchanged.")
+
     elif args.command == "sync":
         success, msg = core.git_sync()
         print(msg)
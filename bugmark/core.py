@@ -1,14 +1,21 @@
 from pathlib import Path
-from typing import Optional, List, Any, Dict
+from typing import Optional, List, Any, Dict, Union
 import json
 import os
-import re
 import subprocess
-from .storage import JSONStorage, SQLiteStorage, BugStorage
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from .storage import JSONStorage, SQLiteStorage, BugStorage, open_store, merge_stores
+from .snapshot import Snapshot, SnapshotBug, write_snapshot
+from .models import Bug
+from . import minhash
 from .constants import Status, Severity
 from .utils import (
     export_bugs, import_bugs, create_backup, install_git_hook, 
-    scan_for_todos, get_bug_stats, generate_ascii_chart
+    scan_for_todos, get_bug_stats, generate_ascii_chart,
+    iter_git_commits, parse_bug_refs, git_merge_base, is_git_ancestor, local_datetime,
+    get_git_head, git_commit_before, git_diff_files, remap_line, install_merge_driver,
+    normalize_path, bug_matches, sort_bugs, FILTER_FIELDS
 )
 
 class BugmarkCore:
@@ -16,6 +23,8 @@ class BugmarkCore:
         self.project_root = project_root or Path.cwd()
         self.config = self._load_config()
         self.storage = self._init_storage()
+        self.snapshot_path = Path(self.config["data_dir"]) / "bugs.snap"
+        self._snapshot: Optional[Snapshot] = None
         self._auto_backup()
 
     def _load_config(self):
@@ -24,7 +33,11 @@ class BugmarkCore:
             "storage_type": "json",
             "data_dir": str(Path.home() / "bugmark"),
             "db_name": "bugs.json",
-            "saved_filters": {}
+            "saved_filters": {},
+            "encoding": None,
+            "compression": None,
+            "history_retention": {"days": 90, "keep_last": 10, "keep_fields": ["status"]},
+            "duplicate_threshold": 0.5
         }
         if config_path.exists():
             with open(config_path, "r") as f:
@@ -41,56 +54,81 @@ class BugmarkCore:
         storage_type = self.config["storage_type"]
         
         if storage_type == "sqlite":
-            db_path = data_dir / "bugs.db"
-            return SQLiteStorage(db_path)
+            self.storage_path = data_dir / "bugs.db"
+            return SQLiteStorage(self.storage_path)
         else:
-            db_path = data_dir / "bugs.json"
-            return JSONStorage(db_path)
+            self.storage_path = data_dir / "bugs.json"
+            storage = JSONStorage(self.storage_path, self.config["encoding"], self.config["compression"])
+            storage.migrate_sidecars()
+            return storage
 
     def _auto_backup(self):
         data_dir = Path(self.config["data_dir"])
         create_backup(data_dir)
 
+    def refresh_snapshot(self):
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+        # Read the generation first so a concurrent write leaves the snapshot stale, not wrong
+        generation = self.storage.get_generation()
+        write_snapshot(self.storage.list_bugs(), self.snapshot_path, generation)
+
+    def _current_snapshot(self) -> Optional[Snapshot]:
+        # The snapshot matching the storage generation, if there is one, without rebuilding
+        generation = self.storage.get_generation()
+        if self._snapshot is not None and self._snapshot.generation != generation:
+            self._snapshot.close()
+            self._snapshot = None
+        if self._snapshot is None:
+            self._snapshot = Snapshot.open(self.snapshot_path, generation)
+        return self._snapshot
+
+    def snapshot(self) -> Snapshot:
+        # Writes only move the storage generation; the first query after one rebuilds
+        if self._current_snapshot() is None:
+            self.refresh_snapshot()
+            self._snapshot = Snapshot(self.snapshot_path)
+        return self._snapshot
+
+    def query_bugs(self, tag=None, file=None, status=None, severity=None, search=None, sort_by="date") -> List[SnapshotBug]:
+        if file:
+            file = normalize_path(file, self.project_root)
+        return self.snapshot().select(tag=tag, file=file, status=status, severity=severity, search=search, sort_by=sort_by)
+
+    def _location_key(self, path: str):
+        key = normalize_path(path, self.project_root)
+        recursive = path.endswith(("/", "\\")) or (self.project_root / key).is_dir()
+        return key, recursive
+
+    def bugs_at(self, path: str, start_line: Optional[int] = None, end_line: Optional[int] = None) -> List[Union[SnapshotBug, Bug]]:
+        key, recursive = self._location_key(path)
+        snapshot = self._current_snapshot()
+        if snapshot is None:
+            # Right after a write the storage's location index answers without a full rebuild
+            return self.storage.find_by_location(key, start_line, end_line, recursive=recursive)
+        return snapshot.bugs_at(key, start_line, end_line, recursive=recursive)
+
+    def load_bugs_at(self, path: str, start_line: Optional[int] = None, end_line: Optional[int] = None) -> List[Bug]:
+        key, recursive = self._location_key(path)
+        return self.storage.find_by_location(key, start_line, end_line, recursive=recursive)
+
     def add_bug(self, desc: str, file: str, line: int, tags: List[str], severity: str = "major", owner: str = None, due_date: str = None):
         from .models import Bug
-        bug = Bug(desc=desc, file=file, line=line, tags=tags, severity=Severity(severity), owner=owner, due_date=due_date)
+        # Anchors are stored project-relative, the same form `at` and the location index query with
+        file = normalize_path(file, self.project_root)
+        bug = Bug(desc=desc, file=file, line=line, tags=tags, severity=Severity(severity), owner=owner, due_date=due_date,
+                  commit=get_git_head(self.project_root))
         self.storage.save_bug(bug)
         return bug.bug_id
 
     def list_bugs(self, tag=None, file=None, status=None, severity=None, search=None, sort_by="date"):
         bugs = self.storage.list_bugs()
-        filtered = []
-        for bug in bugs:
-            if tag and tag not in bug.tags:
-                continue
-            if file and file != bug.file:
-                continue
-            if status and status != bug.status:
-                continue
-            if severity and severity != bug.severity:
-                continue
-            if search:
-                try:
-                    if not re.search(search, bug.desc, re.IGNORECASE):
-                        continue
-                except re.error:
-                    if search.lower() not in bug.desc.lower():
-                        continue
-            filtered.append(bug)
-
-        # Sorting
-        if sort_by == "severity":
-            severity_order = {Severity.CRITICAL: 0, Severity.MAJOR: 1, Severity.MINOR: 2}
-            filtered.sort(key=lambda b: severity_order.get(b.severity, 3))
-        elif sort_by == "status":
-            status_order = {Status.OPEN: 0, Status.IN_PROGRESS: 1, Status.RESOLVED: 2, Status.CLOSED: 3}
-            filtered.sort(key=lambda b: status_order.get(b.status, 4))
-        elif sort_by == "file":
-            filtered.sort(key=lambda b: (b.file, b.line))
-        else: # date
-            filtered.sort(key=lambda b: b.created, reverse=True)
-
-        return filtered
+        filtered = [
+            bug for bug in bugs
+            if bug_matches(bug, tag=tag, file=file, status=status, severity=severity, search=search)
+        ]
+        return sort_bugs(filtered, sort_by)
 
     def resolve_bug(self, bug_id: str, user: str = "system"):
         bug = self.storage.get_bug(bug_id)
@@ -113,11 +151,38 @@ class BugmarkCore:
         return False
 
     def save_filter(self, name: str, filters: Dict[str, Any]):
-        self.config["saved_filters"][name] = filters
-        self._save_config()
+        # Saved filters live in the store as views whose membership is kept up to date on every write
+        filters = {k: filters[k] for k in FILTER_FIELDS if filters.get(k)}
+        self.storage.save_view(name, filters)
 
     def get_filter(self, name: str) -> Optional[Dict[str, Any]]:
-        return self.config["saved_filters"].get(name)
+        view = self.storage.get_view(name)
+        if view is not None:
+            return view["filters"]
+        filters = self.config["saved_filters"].get(name)
+        if filters is not None:
+            self.save_filter(name, filters)
+        return filters
+
+    def view_bugs(self, name: str, search=None, sort_by="date") -> Optional[List[Bug]]:
+        if self.get_filter(name) is None:
+            return None
+        view = self.storage.get_view(name)
+        bugs = self.storage.get_bugs(view["members"])
+        if search:
+            bugs = [bug for bug in bugs if bug_matches(bug, search=search)]
+        return sort_bugs(bugs, sort_by)
+
+    def watch_filter(self, name: str):
+        if self.get_filter(name) is None:
+            return None
+        view = self.storage.get_view(name)
+        members = set(view["members"])
+        watched = set(view["watched"] or [])
+        added, removed = sorted(members - watched), sorted(watched - members)
+        if added or removed or view["watched"] is None:
+            self.storage.set_view_watched(name, list(members))
+        return added, removed
 
     def export_all(self, format: str, output_path: str):
         bugs = self.storage.list_bugs()
@@ -125,24 +190,284 @@ class BugmarkCore:
 
     def import_from_file(self, input_path: str):
         bugs = import_bugs(Path(input_path))
-        for bug in bugs:
-            self.storage.save_bug(bug)
+        self.storage.save_bugs(bugs)
         return len(bugs)
 
+    def compact(self, days: Optional[int] = None, keep_last: Optional[int] = None,
+                encoding: Optional[str] = None, compression: Optional[str] = None):
+        retention = self.config["history_retention"]
+        days = retention.get("days", 90) if days is None else days
+        keep_last = retention.get("keep_last", 10) if keep_last is None else keep_last
+        before = (datetime.now() - timedelta(days=days)).isoformat()
+
+        if isinstance(self.storage, JSONStorage):
+            self.storage.encoding = encoding or self.storage.encoding
+            self.storage.compression = compression or self.storage.compression
+
+        size_before = self.storage_path.stat().st_size
+        compacted = []
+        folded = 0
+        for bug in self.storage.list_bugs():
+            count = bug.compact_history(before, keep_last, retention.get("keep_fields", []))
+            if count:
+                folded += count
+                compacted.append(bug)
+        self.storage.save_bugs(compacted)
+        self.storage.compact_storage()
+        return {
+            "bugs": len(compacted),
+            "folded": folded,
+            "size_before": size_before,
+            "size_after": self.storage_path.stat().st_size
+        }
+
     def install_hooks(self):
-        return install_git_hook(self.project_root)
+        success, msg = install_git_hook(self.project_root)
+        if not (self.project_root / ".git").exists():
+            return success, msg
+        _, driver_msg = install_merge_driver(self.project_root, self.storage_path)
+        return success, f"{msg} {driver_msg}"
+
+    def merge_store(self, other_path: str, base_path: Optional[str] = None):
+        other = open_store(Path(other_path))
+        if other is None:
+            return None
+        base = open_store(Path(base_path)) if base_path else None
+        return merge_stores(self.storage, other, base)
+
+    def index_commits(self, user: Optional[str] = None):
+        if not (self.project_root / ".git").exists():
+            return False, "Not a git repository."
+        watermark = self.storage.get_meta("last_indexed_commit")
+        if watermark:
+            # After an amend or rebase, resume from where the rewritten history forks
+            watermark = git_merge_base(self.project_root, watermark)
+
+        links = []
+        last_sha = None
+        try:
+            for commit in iter_git_commits(self.project_root, since=watermark):
+                last_sha = commit["sha"]
+                summary = commit["message"].split("\n", 1)[0]
+                for bug_id, action in parse_bug_refs(commit["message"]):
+                    links.append({
+                        "sha": commit["sha"],
+                        "bug_id": bug_id,
+                        "action": action,
+                        "author": commit["author"],
+                        "date": commit["date"],
+                        "summary": summary
+                    })
+        except subprocess.CalledProcessError as e:
+            return False, f"Commit indexing failed: {e}"
+
+        known = {bug.bug_id: bug for bug in self.storage.get_bugs({l["bug_id"] for l in links})}
+        links = [l for l in links if l["bug_id"] in known]
+        # Commits seen by an earlier pass already applied their transitions
+        indexed = self.storage.get_indexed_commits({l["sha"] for l in links})
+        transitions = {}
+        for link in links:
+            if link["action"] != "refs" and link["sha"] not in indexed and self._commit_follows_bug(link, known[link["bug_id"]]):
+                transitions[link["bug_id"]] = (link["action"], user or link["author"])
+        self.storage.add_commit_links(links)
+
+        transitioned = []
+        for bug_id, (action, author) in transitions.items():
+            bug = known.get(bug_id)
+            if bug and bug.status in [Status.OPEN, Status.IN_PROGRESS]:
+                bug.update_field(author, "status", Status.CLOSED if action == "closes" else Status.RESOLVED)
+                transitioned.append(bug)
+        if transitioned:
+            self.storage.save_bugs(transitioned)
+
+        if last_sha:
+            self.storage.set_meta("last_indexed_commit", last_sha)
+        return True, f"Indexed {len(links)} bug references."
+
+    def _commit_follows_bug(self, link: Dict[str, str], bug: Bug) -> bool:
+        # Bug ids are short numbers, so older commits often reference another tracker's
+        # issue with the same number; only commits made after the bug may change it
+        try:
+            # Commit dates have one-second resolution
+            if local_datetime(link["date"]) < local_datetime(bug.created).replace(microsecond=0):
+                return False
+        except ValueError:
+            pass
+        return not bug.commit or is_git_ancestor(self.project_root, bug.commit, link["sha"])
+
+    def get_bug_commits(self, bug_id: str) -> List[Dict[str, str]]:
+        return self.storage.get_commit_links(bug_id)
+
+    def reanchor_bugs(self, dry_run: bool = False, user: str = "reanchor"):
+        if not (self.project_root / ".git").exists():
+            return False, "Not a git repository.", []
+        head = get_git_head(self.project_root)
+        if not head:
+            return False, "Repository has no commits.", []
+
+        by_base: Dict[str, List[Bug]] = {}
+        for bug in self.storage.list_bugs():
+            if bug.status not in [Status.OPEN, Status.IN_PROGRESS] or not bug.file or "anchor-lost" in bug.tags:
+                continue
+            base = bug.commit or git_commit_before(self.project_root, bug.created)
+            if base and base != head:
+                by_base.setdefault(base, []).append(bug)
+
+        def remap_base(base):
+            # One rename-aware diff per base commit covers every bug recorded at it
+            bugs = by_base[base]
+            keys = {bug.bug_id: normalize_path(bug.file, self.project_root) for bug in bugs}
+            try:
+                files = git_diff_files(self.project_root, base, sorted(set(keys.values())))
+            except subprocess.CalledProcessError as e:
+                stderr = (e.stderr or "").strip()
+                error = stderr.splitlines()[0] if stderr else f"git diff exited with {e.returncode}"
+                return [(bug, None, None, error) for bug in bugs]
+            results = []
+            for bug in bugs:
+                if keys[bug.bug_id] not in files:
+                    results.append((bug, bug.file, bug.line, None))
+                    continue
+                new_file, hunks = files[keys[bug.bug_id]]
+                if new_file is None:
+                    results.append((bug, None, None, None))
+                    continue
+                if new_file == keys[bug.bug_id]:
+                    new_file = bug.file
+                results.append((bug, new_file, remap_line(bug.line, hunks), None))
+            return results
+
+        changes = []
+        updated = []
+        failed = 0
+        workers = min(8, (os.cpu_count() or 1) + 1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for results in pool.map(remap_base, list(by_base)):
+                for bug, new_file, new_line, error in results:
+                    change = {"bug_id": bug.bug_id, "file": bug.file, "old_line": bug.line,
+                              "new_file": new_file, "new_line": new_line}
+                    if error is not None:
+                        # Leave the bug and its recorded commit alone so a later run can retry
+                        failed += 1
+                        changes.append({**change, "error": error})
+                        continue
+                    if new_line is None:
+                        changes.append(change)
+                        if not dry_run and "anchor-lost" not in bug.tags:
+                            bug.update_field(user, "tags", bug.tags + ["anchor-lost"])
+                            updated.append(bug)
+                        continue
+                    if new_line != bug.line or new_file != bug.file:
+                        changes.append(change)
+                    if not dry_run:
+                        bug.update_field(user, "file", new_file)
+                        bug.update_field(user, "line", new_line)
+                        bug.commit = head
+                        updated.append(bug)
+        if updated:
+            self.storage.save_bugs(updated)
+        msg = f"Checked {sum(len(v) for v in by_base.values())} anchored bugs."
+        if failed:
+            msg += f" {failed} could not be remapped."
+        return True, msg, changes
+
+    def _duplicate_score(self, sig_a: List[int], sig_b: List[int], file_a: str, line_a: int, b: Bug) -> float:
+        score = minhash.similarity(sig_a, sig_b)
+        if file_a and normalize_path(file_a) == normalize_path(b.file):
+            score += 0.1
+            if line_a is not None and abs(line_a - b.line) <= 10:
+                score += 0.1
+        return min(score, 1.0)
+
+    def _rank_duplicates(self, sig: List[int], file: Optional[str], line: Optional[int], bugs: List[Bug],
+                         signatures: Dict[str, List[int]], limit: int = 5):
+        threshold = self.config["duplicate_threshold"]
+        matches = []
+        for bug in bugs:
+            if bug.bug_id not in signatures or "duplicate" in bug.tags:
+                continue
+            score = self._duplicate_score(sig, signatures[bug.bug_id], file, line, bug)
+            if score >= threshold:
+                matches.append((bug, score))
+        matches.sort(key=lambda m: m[1], reverse=True)
+        return matches[:limit]
+
+    def find_duplicates(self, desc: str, file: Optional[str] = None, line: Optional[int] = None,
+                        exclude: Optional[str] = None, limit: int = 5):
+        sig = minhash.signature(desc)
+        candidates = [c for c in self.storage.find_bucket_candidates(minhash.band_keys(sig)) if c != exclude]
+        if not candidates:
+            return []
+        signatures = self.storage.get_signatures(candidates)
+        return self._rank_duplicates(sig, file, line, self.storage.get_bugs(candidates), signatures, limit)
+
+    def find_duplicate_clusters(self) -> List[List[Bug]]:
+        # Only bugs sharing an LSH band are compared; bugs already merged as duplicates are left out
+        buckets = self.storage.list_buckets()
+        ids = sorted({bug_id for members in buckets for bug_id in members})
+        signatures = self.storage.get_signatures(ids)
+        bugs = {bug.bug_id: bug for bug in self.storage.get_bugs(ids) if "duplicate" not in bug.tags}
+        threshold = self.config["duplicate_threshold"]
+        clusters = minhash.DisjointSet()
+        for members in buckets:
+            members = [bug_id for bug_id in members if bug_id in bugs and bug_id in signatures]
+            for i, a in enumerate(members):
+                for b in members[i + 1:]:
+                    if clusters.find(a) == clusters.find(b):
+                        continue
+                    score = self._duplicate_score(signatures[a], signatures[b], bugs[a].file, bugs[a].line, bugs[b])
+                    if score >= threshold:
+                        clusters.union(a, b)
+        return [[bugs[bug_id] for bug_id in group] for group in clusters.groups()]
+
+    def merge_duplicates(self, bugs: List[Bug], user: str = "system") -> str:
+        primary = min(bugs, key=lambda b: b.created)
+        duplicates = [b for b in bugs if b.bug_id != primary.bug_id]
+        tags = list(primary.tags)
+        for bug in duplicates:
+            tags += [t for t in bug.tags if t not in tags]
+            if "duplicate" not in bug.tags:
+                bug.update_field(user, "tags", bug.tags + ["duplicate"])
+            if bug.status not in [Status.RESOLVED, Status.CLOSED]:
+                bug.update_field(user, "status", Status.CLOSED)
+            bug.add_comment(user, f"Duplicate of #{primary.bug_id}")
+        primary.update_field(user, "tags", tags)
+        primary.add_comment(user, "Merged duplicates: " + ", ".join(f"#{b.bug_id}" for b in duplicates))
+        self.storage.save_bugs([primary] + duplicates)
+        return primary.bug_id
 
     def scan_todos(self, auto_add=False):
         todos = scan_for_todos(self.project_root)
-        if auto_add:
-            for todo in todos:
-                self.add_bug(
+        if not auto_add:
+            return todos
+        # Buckets, signatures and candidate bugs are loaded once for the whole scan
+        sigs = [minhash.signature(f"[{todo['type']}] {todo['desc']}") for todo in todos]
+        band_keys = [minhash.band_keys(sig) for sig in sigs]
+        buckets = self.storage.get_buckets({key for keys in band_keys for key in keys})
+        candidate_ids = sorted({bug_id for members in buckets.values() for bug_id in members})
+        signatures = self.storage.get_signatures(candidate_ids) if candidate_ids else {}
+        candidates = {bug.bug_id: bug for bug in self.storage.get_bugs(candidate_ids)} if candidate_ids else {}
+        for todo, sig, keys in zip(todos, sigs, band_keys):
+            ids = sorted({bug_id for key in keys for bug_id in buckets.get(key, [])})
+            bugs = [candidates[bug_id] for bug_id in ids if bug_id in candidates]
+            for bug, _ in self._rank_duplicates(sig, todo["file"], todo["line"], bugs, signatures):
+                if normalize_path(bug.file) == normalize_path(todo["file"]):
+                    todo["duplicate_of"] = bug.bug_id
+                    break
+        todos_to_add = [todo for todo in todos if "duplicate_of" not in todo]
+        if todos_to_add:
+            head = get_git_head(self.project_root)
+            self.storage.save_bugs([
+                Bug(
                     desc=f"[{todo['type']}] {todo['desc']}",
                     file=todo["file"],
                     line=todo["line"],
                     tags=[todo["type"].lower(), "auto-created"],
-                    severity="minor"
+                    severity=Severity.MINOR,
+                    commit=head
                 )
+                for todo in todos_to_add
+            ])
         return todos
 
     def get_stats(self):
@@ -156,6 +481,74 @@ class BugmarkCore:
         reports.append(generate_ascii_chart(stats["severity"], "Severity Distribution"))
         return "\n\n".join(reports)
 
+    def get_trends(self, days: int = 30, end: Optional[str] = None, severity: Optional[str] = None,
+                   owner: Optional[str] = None):
+        if days < 1:
+            raise ValueError("days must be at least 1")
+        end_date = datetime.fromisoformat(end).date() if end else datetime.now().date()
+        start_date = end_date - timedelta(days=days - 1)
+        day_list = [(start_date + timedelta(days=i)).isoformat() for i in range(days)]
+
+        def keep(row):
+            return (not severity or row[1] == severity) and (owner is None or row[2] == owner)
+
+        def open_delta(row):
+            opened, resolved, reopened, moved_in, moved_out = row[3:8]
+            return opened + reopened + moved_in - resolved - moved_out
+
+        open_by_severity = {s.value: 0 for s in Severity}
+        for row in self.storage.query_rollups(end=(start_date - timedelta(days=1)).isoformat()):
+            if keep(row):
+                open_by_severity[row[1]] += open_delta(row)
+
+        trends = {
+            "days": day_list,
+            "opened": {d: 0 for d in day_list},
+            "resolved": {d: 0 for d in day_list},
+            "reopened": {d: 0 for d in day_list},
+            "open": {},
+            "open_by_severity": {s.value: {} for s in Severity},
+            "mttr_hours": None
+        }
+        daily = {d: [] for d in day_list}
+        for row in self.storage.query_rollups(start=day_list[0], end=day_list[-1]):
+            if keep(row):
+                daily[row[0]].append(row)
+
+        resolved_total, resolve_seconds = 0, 0
+        for d in day_list:
+            for row in daily[d]:
+                trends["opened"][d] += row[3]
+                trends["resolved"][d] += row[4]
+                trends["reopened"][d] += row[5]
+                resolved_total += row[4]
+                resolve_seconds += row[8]
+                open_by_severity[row[1]] += open_delta(row)
+            for sev, count in open_by_severity.items():
+                trends["open_by_severity"][sev][d] = count
+            trends["open"][d] = sum(open_by_severity.values())
+        if resolved_total:
+            trends["mttr_hours"] = resolve_seconds / resolved_total / 3600
+        return trends
+
+    def get_trends_report(self, days: int = 30, severity: Optional[str] = None, owner: Optional[str] = None):
+        trends = self.get_trends(days=days, severity=severity, owner=owner)
+        reports = [
+            generate_ascii_chart(trends["open"], "Open Bugs"),
+            generate_ascii_chart(trends["opened"], "Opened per Day"),
+            generate_ascii_chart(trends["resolved"], "Resolved per Day"),
+        ]
+        if any(trends["reopened"].values()):
+            reports.append(generate_ascii_chart(trends["reopened"], "Reopened per Day"))
+        for sev, series in trends["open_by_severity"].items():
+            if any(series.values()) and not severity:
+                reports.append(generate_ascii_chart(series, f"Burndown ({sev})"))
+        if trends["mttr_hours"] is None:
+            reports.append("Mean time to resolve: n/a")
+        else:
+            reports.append(f"Mean time to resolve: {trends['mttr_hours']:.1f} hours")
+        return "\n\n".join(reports)
+
     def git_sync(self):
         # Basic git sync: pull then push the data file if it's in the repo
         data_dir = Path(self.config["data_dir"])
@@ -166,6 +559,7 @@ class BugmarkCore:
             subprocess.run(["git", "pull"], cwd=self.project_root, check=True)
             # We don't auto-commit/push here as it might be intrusive, 
             # but we can provide the command or a flag.
-            return True, "Git pull successful."
+            _, index_msg = self.index_commits()
+            return True, f"Git pull successful. {index_msg}"
         except Exception as e:
             return False, f"Git sync failed: {e}"
@@ -0,0 +1,65 @@
+import hashlib
+import re
+import struct
+import zlib
+from typing import Dict, Iterable, List, Set
+
+# Bump when signatures change so stored indexes are rebuilt
+VERSION = 2
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 4
+_PACKED = struct.Struct(f"<{NUM_PERM}I")
+
+def shingles(text: str) -> Set[bytes]:
+    text = " ".join(re.findall(r"[a-z0-9]+", text.lower())).encode("utf-8")
+    if len(text) <= SHINGLE:
+        return {text}
+    return {text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1)}
+
+def signature(text: str) -> List[int]:
+    # One SHAKE-128 digest per shingle gives all NUM_PERM hash values at once
+    rows = [_PACKED.unpack(hashlib.shake_128(s).digest(_PACKED.size)) for s in shingles(text)]
+    return list(map(min, zip(*rows)))
+
+def pack(sig: List[int]) -> bytes:
+    return _PACKED.pack(*sig)
+
+def unpack(raw: bytes) -> List[int]:
+    return list(_PACKED.unpack(raw))
+
+def band_keys(sig: List[int]) -> List[str]:
+    # Two signatures share a band key only if all ROWS values of that band agree
+    keys = []
+    for band in range(BANDS):
+        chunk = struct.pack(f"<{ROWS}I", *sig[band * ROWS:(band + 1) * ROWS])
+        keys.append(f"{band}:{zlib.crc32(chunk):08x}")
+    return keys
+
+def similarity(a: List[int], b: List[int]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+class DisjointSet:
+    def __init__(self, items: Iterable[str] = ()):
+        self.parent: Dict[str, str] = {item: item for item in items}
+
+    def find(self, item: str) -> str:
+        self.parent.setdefault(item, item)
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a: str, b: str):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+    def groups(self) -> List[List[str]]:
+        groups: Dict[str, List[str]] = {}
+        for item in self.parent:
+            groups.setdefault(self.find(item), []).append(item)
+        return [sorted(members) for members in groups.values() if len(members) > 1]
@@ -1,8 +1,15 @@
 from datetime import datetime
 from typing import List, Optional, Dict, Any
+import hashlib
+import json
 import uuid
 from .constants import Severity, Status
 
+MERGE_FIELDS = ["desc", "file", "line", "tags", "severity", "status", "owner", "due_date"]
+
+def content_hash(data: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
 class Comment:
     def __init__(self, author: str, text: str, timestamp: Optional[str] = None):
         self.author = author
@@ -55,7 +62,8 @@ class Bug:
                  created: Optional[str] = None,
                  resolved: Optional[str] = None,
                  comments: Optional[List[Comment]] = None,
-                 history: Optional[List[HistoryItem]] = None):
+                 history: Optional[List[HistoryItem]] = None,
+                 commit: Optional[str] = None):
         self.bug_id = bug_id or str(uuid.uuid4().int)[:4]
         self.desc = desc
         self.file = file
@@ -69,6 +77,7 @@ class Bug:
         self.resolved = resolved
         self.comments = comments or []
         self.history = history or []
+        self.commit = commit
 
     @property
     def is_stale(self) -> bool:
@@ -89,6 +98,72 @@ class Bug:
             if field == "status" and new_value == Status.RESOLVED:
                 self.resolved = datetime.now().isoformat()
 
+    def compact_history(self, before: str, keep_last: int = 0, keep_fields: Optional[List[str]] = None) -> int:
+        # Fold history items older than `before` into one summary item, keeping the
+        # newest `keep_last` items and every change to a field in `keep_fields`
+        keep_fields = keep_fields or []
+        protected = set(range(max(len(self.history) - keep_last, 0), len(self.history)))
+        folded, kept = [], []
+        for i, item in enumerate(self.history):
+            if i in protected or item.timestamp >= before or (item.field in keep_fields and item.field != "summary"):
+                kept.append(item)
+            else:
+                folded.append(item)
+        if len(folded) < 2:
+            return 0
+
+        summary = {"count": 0, "fields": {}, "users": {}, "first": None, "last": None}
+        for item in folded:
+            if item.field == "summary":
+                part = item.new_value
+            else:
+                part = {"count": 1, "fields": {item.field: 1}, "users": {item.user: 1},
+                        "first": item.timestamp, "last": item.timestamp}
+            summary["count"] += part["count"]
+            for key in ["fields", "users"]:
+                for name, count in part[key].items():
+                    summary[key][name] = summary[key].get(name, 0) + count
+            summary["first"] = min(filter(None, [summary["first"], part["first"]]))
+            summary["last"] = max(filter(None, [summary["last"], part["last"]]))
+        self.history = [HistoryItem("bugmark", "summary", None, summary, summary["first"])] + kept
+        return len(folded)
+
+    def _last_change(self, field: str) -> Optional[str]:
+        stamps = [h.timestamp for h in self.history if h.field == field]
+        return max(stamps) if stamps else None
+
+    def merge(self, other: 'Bug', base: Optional['Bug'] = None) -> 'Bug':
+        # Per-field merge: a side that did not move away from `base` yields to the
+        # other; otherwise the side with the latest history entry for the field wins
+        merged = Bug.from_dict(self.to_dict())
+        for field in MERGE_FIELDS:
+            mine, theirs = getattr(self, field), getattr(other, field)
+            if mine == theirs:
+                continue
+            if base is not None and mine == getattr(base, field):
+                take_theirs = True
+            elif base is not None and theirs == getattr(base, field):
+                take_theirs = False
+            else:
+                my_stamp, their_stamp = self._last_change(field), other._last_change(field)
+                take_theirs = their_stamp is not None and (my_stamp is None or their_stamp > my_stamp)
+            if take_theirs:
+                setattr(merged, field, theirs)
+                if field == "status":
+                    merged.resolved = other.resolved
+                elif field == "line":
+                    merged.commit = other.commit
+
+        merged.created = min(self.created, other.created)
+        comments = {(c.timestamp, c.author, c.text): c for c in self.comments + other.comments}
+        merged.comments = [comments[k] for k in sorted(comments)]
+        history = {}
+        for h in self.history + other.history:
+            key = (h.timestamp, h.user, h.field, json.dumps(h.old_value, sort_keys=True), json.dumps(h.new_value, sort_keys=True))
+            history[key] = h
+        merged.history = [history[k] for k in sorted(history)]
+        return merged
+
     def to_dict(self) -> Dict[str, Any]:
         return {
             "bug_id": self.bug_id,
@@ -103,7 +178,8 @@ class Bug:
             "created": self.created,
             "resolved": self.resolved,
             "comments": [c.to_dict() for c in self.comments],
-            "history": [h.to_dict() for h in self.history]
+            "history": [h.to_dict() for h in self.history],
+            "commit": self.commit
         }
 
     @classmethod
@@ -123,5 +199,6 @@ class Bug:
             created=data.get("created"),
             resolved=data.get("resolved"),
             comments=comments,
-            history=history
+            history=history,
+            commit=data.get("commit")
         )
@@ -0,0 +1,297 @@
+import mmap
+import re
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from .models import Bug
+from .constants import Severity, Status
+from .utils import normalize_path, prefix_bounds, iso_to_micros, micros_to_iso, atomic_write, EPOCH
+
+MAGIC = b"BMSNAP02"
+HEADER = struct.Struct("<8sBxxxIIIqq")
+NONE_INDEX = 0xFFFFFFFF
+
+STATUSES = list(Status)
+SEVERITIES = list(Severity)
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+def _layout(count: int, n_strings: int, n_files: int):
+    # (name, typecode, length) for every fixed-width column, in file order
+    columns = [
+        ("ids", "I", count),
+        ("descs", "I", count),
+        ("tags", "I", count),
+        ("owners", "I", count),
+        ("files", "I", count),
+        ("lines", "i", count),
+        ("created", "q", count),
+        ("status", "B", count),
+        ("severity", "B", count),
+        ("file_table", "I", n_files),
+        ("file_starts", "I", n_files + 1),
+        ("by_file", "I", count),
+        ("str_offsets", "I", n_strings + 1),
+    ]
+    offsets = {}
+    offset = _align(HEADER.size)
+    for name, typecode, length in columns:
+        offsets[name] = (offset, typecode, length)
+        offset = _align(offset + array(typecode).itemsize * length)
+    return offsets, offset
+
+class _StringTable:
+    def __init__(self):
+        self.index = {}
+        self.values: List[bytes] = []
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return NONE_INDEX
+        if value not in self.index:
+            self.index[value] = len(self.values)
+            self.values.append(value.encode("utf-8"))
+        return self.index[value]
+
+def write_snapshot(bugs: List[Bug], path: Path, generation: Tuple[int, int]):
+    strings = _StringTable()
+    columns = {name: array(typecode) for name, typecode in [
+        ("ids", "I"), ("descs", "I"), ("tags", "I"), ("owners", "I"), ("files", "I"),
+        ("lines", "i"), ("created", "q"), ("status", "B"), ("severity", "B"),
+    ]}
+    for bug in bugs:
+        columns["ids"].append(strings.add(bug.bug_id))
+        columns["descs"].append(strings.add(bug.desc))
+        columns["tags"].append(strings.add(",".join(bug.tags)))
+        columns["owners"].append(strings.add(bug.owner))
+        columns["files"].append(strings.add(bug.file))
+        columns["lines"].append(int(bug.line))
+        columns["created"].append(iso_to_micros(bug.created))
+        columns["status"].append(STATUSES.index(bug.status))
+        columns["severity"].append(SEVERITIES.index(bug.severity))
+
+    keys = [normalize_path(bug.file) for bug in bugs]
+    files = sorted(set(keys))
+    file_rank = {f: i for i, f in enumerate(files)}
+    columns["file_table"] = array("I", [strings.add(f) for f in files])
+    by_file = sorted(range(len(bugs)), key=lambda i: (file_rank[keys[i]], int(bugs[i].line)))
+    columns["by_file"] = array("I", by_file)
+    starts = array("I", [0] * (len(files) + 1))
+    for i in by_file:
+        starts[file_rank[keys[i]] + 1] += 1
+    for i in range(len(files)):
+        starts[i + 1] += starts[i]
+    columns["file_starts"] = starts
+
+    str_offsets = array("I", [0])
+    for value in strings.values:
+        str_offsets.append(str_offsets[-1] + len(value))
+    columns["str_offsets"] = str_offsets
+
+    offsets, blob_offset = _layout(len(bugs), len(strings.values), len(files))
+
+    def write(f):
+        f.write(HEADER.pack(
+            MAGIC, 0 if sys.byteorder == "little" else 1,
+            len(bugs), len(strings.values), len(files), generation[0], generation[1]
+        ))
+        for name, (offset, _, _) in offsets.items():
+            f.write(b"\0" * (offset - f.tell()))
+            columns[name].tofile(f)
+        f.write(b"\0" * (blob_offset - f.tell()))
+        f.write(b"".join(strings.values))
+
+    atomic_write(path, write)
+
+class SnapshotBug:
+    __slots__ = ("_snap", "_i")
+
+    def __init__(self, snap: 'Snapshot', index: int):
+        self._snap = snap
+        self._i = index
+
+    @property
+    def bug_id(self) -> str:
+        return self._snap._string(self._snap.ids[self._i])
+
+    @property
+    def desc(self) -> str:
+        return self._snap._string(self._snap.descs[self._i])
+
+    @property
+    def file(self) -> str:
+        return self._snap._string(self._snap.files[self._i])
+
+    @property
+    def line(self) -> int:
+        return self._snap.lines[self._i]
+
+    @property
+    def tags(self) -> List[str]:
+        joined = self._snap._string(self._snap.tags[self._i])
+        return joined.split(",") if joined else []
+
+    @property
+    def owner(self) -> Optional[str]:
+        return self._snap._string(self._snap.owners[self._i])
+
+    @property
+    def status(self) -> Status:
+        return STATUSES[self._snap.status[self._i]]
+
+    @property
+    def severity(self) -> Severity:
+        return SEVERITIES[self._snap.severity[self._i]]
+
+    @property
+    def created(self) -> str:
+        return micros_to_iso(self._snap.created[self._i])
+
+    @property
+    def is_stale(self) -> bool:
+        if self.status in [Status.RESOLVED, Status.CLOSED]:
+            return False
+        created_dt = EPOCH + timedelta(microseconds=self._snap.created[self._i])
+        return (datetime.now() - created_dt).days > 30
+
+class Snapshot:
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, order, self.count, n_strings, n_files, gen_a, gen_b = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or order != (0 if sys.byteorder == "little" else 1):
+            self._mm.close()
+            raise ValueError("Unsupported snapshot format.")
+        self.generation = (gen_a, gen_b)
+        self.n_files = n_files
+        offsets, self._blob_offset = _layout(self.count, n_strings, n_files)
+        self._view = memoryview(self._mm)
+        self._columns = []
+        for name, (offset, typecode, length) in offsets.items():
+            itemsize = array(typecode).itemsize
+            column = self._view[offset:offset + itemsize * length].cast(typecode)
+            setattr(self, name, column)
+            self._columns.append(column)
+
+    @classmethod
+    def open(cls, path: Path, generation: Tuple[int, int]) -> Optional['Snapshot']:
+        if not path.exists():
+            return None
+        try:
+            snap = cls(path)
+        except (ValueError, OSError, struct.error):
+            return None
+        if snap.generation != tuple(generation):
+            snap.close()
+            return None
+        return snap
+
+    def close(self):
+        for column in self._columns:
+            column.release()
+        self._columns = []
+        self._view.release()
+        self._mm.close()
+
+    def _string(self, index: int) -> Optional[str]:
+        if index == NONE_INDEX:
+            return None
+        start = self.str_offsets[index]
+        end = self.str_offsets[index + 1]
+        return self._mm[self._blob_offset + start:self._blob_offset + end].decode("utf-8")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[SnapshotBug]:
+        for i in range(self.count):
+            yield SnapshotBug(self, i)
+
+    def _file_bound(self, key: str) -> int:
+        lo, hi = 0, self.n_files
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._string(self.file_table[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _file_range(self, key: str) -> Tuple[int, int]:
+        slot = self._file_bound(key)
+        if slot < self.n_files and self._string(self.file_table[slot]) == key:
+            return self.file_starts[slot], self.file_starts[slot + 1]
+        return 0, 0
+
+    def _line_bound(self, lo: int, hi: int, line: int) -> int:
+        # by_file is ordered by line within each file's range
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.lines[self.by_file[mid]] < line:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def bugs_at(self, key: str, start_line: Optional[int] = None, end_line: Optional[int] = None,
+                recursive: bool = False) -> List[SnapshotBug]:
+        if recursive:
+            lo, hi = prefix_bounds(key)
+            # The root key "" already falls inside its own bounds
+            start, end = self._file_range(key) if key else (0, 0)
+            indices = list(range(start, end))
+            # by_file is grouped by file key in sorted order, so a subtree is one contiguous run
+            first, last = self._file_bound(lo), self._file_bound(hi)
+            indices += range(self.file_starts[first], self.file_starts[last])
+            return [SnapshotBug(self, self.by_file[i]) for i in indices]
+        start, end = self._file_range(key)
+        if start_line is not None:
+            start = self._line_bound(start, end, start_line)
+        if end_line is not None:
+            end = self._line_bound(start, end, end_line + 1)
+        return [SnapshotBug(self, self.by_file[i]) for i in range(start, end)]
+
+    def select(self, tag=None, file=None, status=None, severity=None, search=None, sort_by="date") -> List[SnapshotBug]:
+        status_code = STATUSES.index(Status(status)) if status else None
+        severity_code = SEVERITIES.index(Severity(severity)) if severity else None
+        pattern = None
+        if search:
+            try:
+                pattern = re.compile(search, re.IGNORECASE)
+            except re.error:
+                pattern = None
+        if file:
+            start, end = self._file_range(normalize_path(file))
+            candidates = [self.by_file[i] for i in range(start, end)]
+        else:
+            candidates = range(self.count)
+        matches = []
+        for i in candidates:
+            if status_code is not None and self.status[i] != status_code:
+                continue
+            if severity_code is not None and self.severity[i] != severity_code:
+                continue
+            bug = SnapshotBug(self, i)
+            if tag and tag not in bug.tags:
+                continue
+            if search:
+                if pattern is not None:
+                    if not pattern.search(bug.desc):
+                        continue
+                elif search.lower() not in bug.desc.lower():
+                    continue
+            matches.append(bug)
+
+        if sort_by == "severity":
+            matches.sort(key=lambda b: self.severity[b._i])
+        elif sort_by == "status":
+            matches.sort(key=lambda b: self.status[b._i])
+        elif sort_by == "file":
+            matches.sort(key=lambda b: (b.file, b.line))
+        else: # date
+            matches.sort(key=lambda b: self.created[b._i], reverse=True)
+        return matches
@@ -1,29 +1,301 @@
+import gzip
 import json
 import os
+import random
 import sqlite3
+from bisect import bisect_left, insort
 from pathlib import Path
-from typing import Dict, List, Optional
-from .models import Bug, Comment, HistoryItem
+from typing import Dict, Iterable, List, Optional, Tuple
+from .models import Bug, Comment, HistoryItem, content_hash
+from . import minhash
 from .constants import Severity, Status
+from .utils import (
+    normalize_path, prefix_bounds, bug_matches, iso_to_micros, micros_to_iso,
+    bug_rollup_events, ROLLUP_METRICS, atomic_write
+)
+
+COMPACT_FORMAT = "bugmark-compact"
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+SEVERITIES = list(Severity)
+STATUSES = list(Status)
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd compression requires the 'zstandard' package (pip install bugmark[zstd]).")
+    return zstandard
+
+class _Interner:
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values = list(values or [])
+        self.index = {v: i for i, v in enumerate(self.values)}
+
+    def add(self, value: Optional[str]) -> Optional[int]:
+        if value is None:
+            return None
+        if value not in self.index:
+            self.index[value] = len(self.values)
+            self.values.append(value)
+        return self.index[value]
+
+    def get(self, index: Optional[int]) -> Optional[str]:
+        return None if index is None else self.values[index]
+
+def _pack_time(timestamp: Optional[str]):
+    # Integer microseconds when that round-trips exactly, the original string otherwise
+    if timestamp is None:
+        return None
+    try:
+        packed = iso_to_micros(timestamp)
+    except (TypeError, ValueError):
+        return timestamp
+    return packed if micros_to_iso(packed) == timestamp else timestamp
+
+def _unpack_time(value):
+    return micros_to_iso(value) if isinstance(value, int) else value
+
+def _apply_rollup(rows: Dict[str, list], data: dict, sign: int):
+    for (day, severity, owner), values in bug_rollup_events(data).items():
+        key = f"{day}|{severity}|{owner}"
+        row = rows.setdefault(key, [0] * len(ROLLUP_METRICS))
+        for i, value in enumerate(values):
+            row[i] += sign * value
+        if not any(row):
+            del rows[key]
+
+def encode_compact(bugs: Dict[str, dict]) -> dict:
+    users, fields = _Interner(), _Interner()
+    packed = {}
+    for bug_id, d in bugs.items():
+        packed[bug_id] = [
+            d["desc"], d["file"], d["line"], d["tags"],
+            SEVERITIES.index(Severity(d.get("severity", Severity.MAJOR))),
+            STATUSES.index(Status(d.get("status", Status.OPEN))),
+            users.add(d.get("owner")), d.get("due_date"),
+            _pack_time(d.get("created")), _pack_time(d.get("resolved")),
+            [[users.add(c["author"]), c["text"], _pack_time(c.get("timestamp"))] for c in d.get("comments", [])],
+            [[users.add(h["user"]), fields.add(h["field"]), h["old_value"], h["new_value"], _pack_time(h.get("timestamp"))]
+             for h in d.get("history", [])],
+            d.get("commit")
+        ]
+    return {"format": COMPACT_FORMAT, "version": 1, "users": users.values, "fields": fields.values, "bugs": packed}
+
+def _decode_record(bug_id: str, p: list, users: _Interner, fields: _Interner) -> dict:
+    return {
+        "bug_id": bug_id,
+        "desc": p[0],
+        "file": p[1],
+        "line": p[2],
+        "tags": p[3],
+        "severity": SEVERITIES[p[4]].value,
+        "status": STATUSES[p[5]].value,
+        "owner": users.get(p[6]),
+        "due_date": p[7],
+        "created": _unpack_time(p[8]),
+        "resolved": _unpack_time(p[9]),
+        "comments": [{"author": users.get(c[0]), "text": c[1], "timestamp": _unpack_time(c[2])} for c in p[10]],
+        "history": [{"user": users.get(h[0]), "field": fields.get(h[1]), "old_value": h[2], "new_value": h[3],
+                     "timestamp": _unpack_time(h[4])} for h in p[11]],
+        "commit": p[12]
+    }
+
+def decode_compact(data: dict) -> Dict[str, dict]:
+    users, fields = _Interner(data["users"]), _Interner(data["fields"])
+    return {bug_id: _decode_record(bug_id, p, users, fields) for bug_id, p in data["bugs"].items()}
+
+def _store_parts(bugs: Dict[str, dict], encoding: str):
+    # The store file as text chunks, naming the chunk that holds each record (and the compact
+    # lookup tables) so readers can seek to single records; joined, it equals a plain json.dumps
+    parts: List[str] = []
+    names: Dict[str, int] = {}
+
+    def add(text: str, name: Optional[str] = None):
+        if name is not None:
+            names[name] = len(parts)
+        parts.append(text)
+
+    if encoding == "compact":
+        data = encode_compact(bugs)
+        separators = (",", ":")
+        add(f'{{"format":{json.dumps(data["format"])},"version":{data["version"]},"users":')
+        add(json.dumps(data["users"], separators=separators), "users")
+        add(',"fields":')
+        add(json.dumps(data["fields"], separators=separators), "fields")
+        add(',"bugs":{')
+        for i, (bug_id, record) in enumerate(data["bugs"].items()):
+            add(("," if i else "") + json.dumps(bug_id) + ":")
+            add(json.dumps(record, separators=separators), "bug:" + bug_id)
+        add("}}")
+    else:
+        add("{")
+        for i, (bug_id, record) in enumerate(bugs.items()):
+            add(("," if i else "") + "\n    " + json.dumps(bug_id) + ": ")
+            # JSON strings never hold raw newlines, so this only re-indents structure
+            add(json.dumps(record, indent=4).replace("\n", "\n    "), "bug:" + bug_id)
+        add("\n}" if bugs else "}")
+    return parts, names
+
+def _create_lsh_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS minhash (
+            bug_id TEXT PRIMARY KEY,
+            signature BLOB
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS lsh_buckets (
+            bucket TEXT,
+            bug_id TEXT,
+            PRIMARY KEY (bucket, bug_id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_lsh_buckets_bug ON lsh_buckets (bug_id)')
+
+def _update_lsh_tables(cursor, old: Dict[str, str], new: Dict[str, str]):
+    # Both map bug ids to descriptions; signatures are only recomputed when desc changed
+    for bug_id, desc in old.items():
+        if new.get(bug_id) != desc:
+            cursor.execute('DELETE FROM lsh_buckets WHERE bug_id = ?', (bug_id,))
+            cursor.execute('DELETE FROM minhash WHERE bug_id = ?', (bug_id,))
+    for bug_id, desc in new.items():
+        if old.get(bug_id) == desc:
+            continue
+        sig = minhash.signature(desc)
+        cursor.execute('INSERT OR REPLACE INTO minhash (bug_id, signature) VALUES (?, ?)', (bug_id, minhash.pack(sig)))
+        cursor.executemany('INSERT OR IGNORE INTO lsh_buckets (bucket, bug_id) VALUES (?, ?)',
+                           [(key, bug_id) for key in minhash.band_keys(sig)])
+
+def _select_signatures(cursor, bug_ids: Optional[Iterable[str]]) -> Dict[str, List[int]]:
+    if bug_ids is None:
+        cursor.execute('SELECT bug_id, signature FROM minhash')
+        rows = cursor.fetchall()
+    else:
+        bug_ids = list(bug_ids)
+        rows = []
+        for i in range(0, len(bug_ids), 500):
+            chunk = bug_ids[i:i + 500]
+            cursor.execute(f'SELECT bug_id, signature FROM minhash WHERE bug_id IN ({",".join("?" * len(chunk))})', chunk)
+            rows.extend(cursor.fetchall())
+    return {bug_id: minhash.unpack(sig) for bug_id, sig in rows}
+
+def _select_buckets(cursor, keys: Iterable[str]) -> Dict[str, List[str]]:
+    keys = list(keys)
+    buckets: Dict[str, List[str]] = {}
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        cursor.execute(f'SELECT bucket, bug_id FROM lsh_buckets WHERE bucket IN ({",".join("?" * len(chunk))})', chunk)
+        for bucket, bug_id in cursor.fetchall():
+            buckets.setdefault(bucket, []).append(bug_id)
+    return buckets
+
+def _select_shared_buckets(cursor) -> List[List[str]]:
+    cursor.execute('''
+        SELECT group_concat(bug_id, char(31)) FROM lsh_buckets
+        GROUP BY bucket HAVING count(*) > 1
+    ''')
+    return [row[0].split("\x1f") for row in cursor.fetchall()]
 
 class BugStorage:
     def save_bug(self, bug: Bug):
         raise NotImplementedError
 
+    def save_bugs(self, bugs: List[Bug], deleted: Iterable[str] = ()):
+        for bug in bugs:
+            self.save_bug(bug)
+        for bug_id in deleted:
+            self.delete_bug(bug_id)
+
     def get_bug(self, bug_id: str) -> Optional[Bug]:
         raise NotImplementedError
 
+    def get_bugs(self, bug_ids: Iterable[str]) -> List[Bug]:
+        bugs = (self.get_bug(bug_id) for bug_id in bug_ids)
+        return [bug for bug in bugs if bug]
+
     def list_bugs(self) -> List[Bug]:
         raise NotImplementedError
 
     def delete_bug(self, bug_id: str):
         raise NotImplementedError
 
+    def get_generation(self) -> Tuple[int, int]:
+        # Changes whenever bugs are written or deleted, and only then
+        raise NotImplementedError
+
+    def get_meta(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set_meta(self, key: str, value: Optional[str]):
+        raise NotImplementedError
+
+    def add_commit_links(self, links: List[Dict[str, str]]):
+        raise NotImplementedError
+
+    def get_commit_links(self, bug_id: str) -> List[Dict[str, str]]:
+        raise NotImplementedError
+
+    def get_indexed_commits(self, shas: Iterable[str]) -> set:
+        raise NotImplementedError
+
+    def find_by_location(self, file_key: str, start_line: Optional[int] = None,
+                         end_line: Optional[int] = None, recursive: bool = False) -> List[Bug]:
+        raise NotImplementedError
+
+    def compact_storage(self):
+        pass
+
+    def save_view(self, name: str, filters: Dict[str, str]):
+        raise NotImplementedError
+
+    def get_view(self, name: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def query_rollups(self, start: Optional[str] = None, end: Optional[str] = None) -> List[tuple]:
+        raise NotImplementedError
+
+    def set_view_watched(self, name: str, members: List[str]):
+        raise NotImplementedError
+
 class JSONStorage(BugStorage):
-    def __init__(self, file_path: Path):
+    def __init__(self, file_path: Path, encoding: Optional[str] = None, compression: Optional[str] = None):
         self.file_path = file_path
+        # None keeps whatever format the file already uses; "none" writes it uncompressed
+        self.encoding = encoding
+        self.compression = compression
+        self._detected = ("pretty", "none")
+        # Sidecars are named after the store, so a store opened outside the data dir
+        # (e.g. git's merge temp files) never picks up unrelated files beside it
+        self.meta_path = self._sidecar_path("meta.json")
+        self.commits_path = self._sidecar_path("commits.json")
+        self.files_path = self._sidecar_path("files.json")
+        self.filters_path = self._sidecar_path("filters.json")
+        self.views_path = self._sidecar_path("views.json")
+        self.rollups_path = self._sidecar_path("rollups.json")
+        self.minhash_path = self._sidecar_path("minhash.db")
         self._ensure_file()
 
+    def _sidecar_path(self, name: str) -> Path:
+        return self.file_path.with_name(f"{self.file_path.stem}.{name}")
+
+    def migrate_sidecars(self):
+        # Earlier versions named the sidecars of the configured store meta.json, commits.json, ...
+        for name in ["meta.json", "commits.json", "filters.json", "views.json"]:
+            old, new = self.file_path.with_name(name), self._sidecar_path(name)
+            if old.exists() and not new.exists():
+                old.replace(new)
+        # Old derived sidecars are rebuilt under the new names; drop the ones recognisably ours
+        for name in ["files.json", "rollups.json", "minhash.json"]:
+            old = self.file_path.with_name(name)
+            try:
+                with open(old, 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if isinstance(data, dict) and "source" in data:
+                old.unlink()
+
     def _ensure_file(self):
         if not self.file_path.exists():
             self.file_path.parent.mkdir(parents=True, exist_ok=True)
@@ -31,32 +303,399 @@ class JSONStorage(BugStorage):
                 json.dump({}, f)
 
     def _load_bugs(self) -> Dict[str, dict]:
-        with open(self.file_path, 'r') as f:
-            return json.load(f)
+        with open(self.file_path, 'rb') as f:
+            raw = f.read()
+        compression = "none"
+        if raw.startswith(GZIP_MAGIC):
+            raw, compression = gzip.decompress(raw), "gzip"
+        elif raw.startswith(ZSTD_MAGIC):
+            raw, compression = _zstd().ZstdDecompressor().decompress(raw), "zstd"
+        data = json.loads(raw)
+        if data.get("format") == COMPACT_FORMAT:
+            self._detected = ("compact", compression)
+            return decode_compact(data)
+        self._detected = ("pretty", compression)
+        return data
+
+    def _write_store(self, bugs: Dict[str, dict]) -> Optional[dict]:
+        # Returns the byte layout of the written file, or None when compressed (no seeking then)
+        encoding = self.encoding or self._detected[0]
+        compression = self.compression or self._detected[1]
+        parts, names = _store_parts(bugs, encoding)
+        chunks = [part.encode("utf-8") for part in parts]
+        raw = b"".join(chunks)
+        layout = None
+        if compression == "none":
+            starts = [0]
+            for chunk in chunks:
+                starts.append(starts[-1] + len(chunk))
+            spans = {name: [starts[i], starts[i + 1]] for name, i in names.items()}
+            layout = {
+                "encoding": encoding,
+                "records": {name[4:]: span for name, span in spans.items() if name.startswith("bug:")},
+                "tables": {name: span for name, span in spans.items() if not name.startswith("bug:")}
+            }
+        if compression == "gzip":
+            raw = gzip.compress(raw, mtime=0)
+        elif compression == "zstd":
+            raw = _zstd().ZstdCompressor().compress(raw)
+        atomic_write(self.file_path, lambda f: f.write(raw))
+        return layout
+
+    def _save_bugs(self, bugs: Dict[str, dict], previous: Optional[Dict[str, Optional[dict]]] = None):
+        # `previous` maps each changed bug id to its stored data before this write (None if new)
+        previous = previous or {}
+        changed = list(previous)
+        index = self._load_derived(self.files_path)
+        defs = self._load_view_defs()
+        views = self._load_derived(self.views_path)
+        if views is not None and set(views["members"]) != set(defs):
+            views = None
+        rollups = self._load_derived(self.rollups_path)
+        lsh = self._open_lsh() if self.minhash_path.exists() else None
+        lsh_fresh = lsh is not None and self._lsh_fresh(lsh.cursor())
+        layout = self._write_store(bugs)
+        if index is not None:
+            self._update_file_index(index, bugs, changed)
+            index["layout"] = layout
+            self._write_derived(self.files_path, index)
+        if views is not None:
+            self._update_views(views, defs, bugs, changed)
+            self._write_derived(self.views_path, views)
+        if rollups is not None:
+            self._update_rollups(rollups, bugs, previous)
+            self._write_derived(self.rollups_path, rollups)
+        if lsh_fresh:
+            # Only the rows of changed bugs are touched; the sidecar is never rewritten whole
+            cursor = lsh.cursor()
+            _update_lsh_tables(cursor, {bug_id: old["desc"] for bug_id, old in previous.items() if old is not None},
+                               {bug_id: bugs[bug_id]["desc"] for bug_id in previous if bug_id in bugs})
+            self._mark_lsh(cursor)
+            lsh.commit()
+        if lsh is not None:
+            lsh.close()
+
+    def _source_stat(self) -> List[int]:
+        stat = self.file_path.stat()
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def get_generation(self) -> Tuple[int, int]:
+        # Only bug writes touch bugs.json; meta, links and views live in sidecars
+        return tuple(self._source_stat())
+
+    def _load_derived(self, path: Path, build=None, bugs: Optional[Dict[str, dict]] = None) -> Optional[dict]:
+        # Sidecars derived from bugs.json are trusted only while its mtime/size match;
+        # otherwise they are rebuilt when the caller has the bugs at hand, or skipped
+        data = self._load_sidecar(path)
+        if data.get("source") == self._source_stat():
+            return data
+        if build is None or bugs is None:
+            return None
+        data = build(bugs, data)
+        self._write_derived(path, data)
+        return data
+
+    def _write_derived(self, path: Path, data: dict):
+        data["source"] = self._source_stat()
+        raw = json.dumps(data, sort_keys=True).encode("utf-8")
+        atomic_write(path, lambda f: f.write(raw))
+
+    def _build_file_index(self, bugs: Dict[str, dict], stale: dict) -> dict:
+        index = {"files": {}, "bugs": {}}
+        for bug_id, data in bugs.items():
+            key = normalize_path(data["file"])
+            index["bugs"][bug_id] = [key, data["line"]]
+            index["files"].setdefault(key, []).append([data["line"], bug_id])
+        for entries in index["files"].values():
+            entries.sort()
+        index["files"] = dict(sorted(index["files"].items()))
+        return index
 
-    def _save_bugs(self, bugs: Dict[str, dict]):
-        with open(self.file_path, 'w') as f:
-            json.dump(bugs, f, indent=4)
+    def _update_file_index(self, index: dict, bugs: Dict[str, dict], changed: Iterable[str]):
+        files, locations = index["files"], index["bugs"]
+        for bug_id in changed:
+            if bug_id in locations:
+                key, line = locations.pop(bug_id)
+                entries = files.get(key, [])
+                pos = bisect_left(entries, [line, bug_id])
+                if pos < len(entries) and entries[pos] == [line, bug_id]:
+                    entries.pop(pos)
+                if not entries:
+                    files.pop(key, None)
+            if bug_id in bugs:
+                key, line = normalize_path(bugs[bug_id]["file"]), bugs[bug_id]["line"]
+                locations[bug_id] = [key, line]
+                insort(files.setdefault(key, []), [line, bug_id])
+
+    def _build_views(self, bugs: Dict[str, dict], stale: dict) -> dict:
+        # Only membership is derived; the definitions live in the filters sidecar and survive rebuilds
+        defs = self._load_view_defs()
+        parsed = [Bug.from_dict(data) for data in bugs.values()] if defs else []
+        members = {name: sorted(b.bug_id for b in parsed if bug_matches(b, **view["filters"]))
+                   for name, view in defs.items()}
+        return {"members": members}
+
+    def _update_views(self, views: dict, defs: dict, bugs: Dict[str, dict], changed: Iterable[str]):
+        if not defs:
+            return
+        parsed = {bug_id: Bug.from_dict(bugs[bug_id]) for bug_id in changed if bug_id in bugs}
+        for name, view in defs.items():
+            members = set(views["members"][name])
+            for bug_id in changed:
+                bug = parsed.get(bug_id)
+                if bug is not None and bug_matches(bug, **view["filters"]):
+                    members.add(bug_id)
+                else:
+                    members.discard(bug_id)
+            views["members"][name] = sorted(members)
+
+    def _build_rollups(self, bugs: Dict[str, dict], stale: dict) -> dict:
+        rollups = {"rows": {}}
+        for data in bugs.values():
+            _apply_rollup(rollups["rows"], data, 1)
+        return rollups
+
+    def _update_rollups(self, rollups: dict, bugs: Dict[str, dict], previous: Dict[str, Optional[dict]]):
+        for bug_id, old in previous.items():
+            if old is not None:
+                _apply_rollup(rollups["rows"], old, -1)
+            if bug_id in bugs:
+                _apply_rollup(rollups["rows"], bugs[bug_id], 1)
+
+    def _open_lsh(self) -> sqlite3.Connection:
+        # The LSH index is a SQLite sidecar so saves update it in place
+        conn = sqlite3.connect(self.minhash_path)
+        cursor = conn.cursor()
+        cursor.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        _create_lsh_tables(cursor)
+        return conn
+
+    def _lsh_fresh(self, cursor) -> bool:
+        cursor.execute('SELECT key, value FROM meta')
+        meta = dict(cursor.fetchall())
+        return meta.get("source") == json.dumps(self._source_stat()) and meta.get("version") == str(minhash.VERSION)
+
+    def _mark_lsh(self, cursor):
+        cursor.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                           [("source", json.dumps(self._source_stat())), ("version", str(minhash.VERSION))])
+
+    def _load_lsh(self) -> sqlite3.Connection:
+        conn = self._open_lsh()
+        cursor = conn.cursor()
+        if not self._lsh_fresh(cursor):
+            bugs = self._load_bugs()
+            cursor.execute('DELETE FROM lsh_buckets')
+            cursor.execute('DELETE FROM minhash')
+            _update_lsh_tables(cursor, {}, {bug_id: data["desc"] for bug_id, data in bugs.items()})
+            self._mark_lsh(cursor)
+            conn.commit()
+        return conn
+
+    def get_signatures(self, bug_ids: Optional[Iterable[str]] = None) -> Dict[str, List[int]]:
+        conn = self._load_lsh()
+        signatures = _select_signatures(conn.cursor(), bug_ids)
+        conn.close()
+        return signatures
+
+    def find_bucket_candidates(self, keys: List[str]) -> List[str]:
+        return sorted({bug_id for members in self.get_buckets(keys).values() for bug_id in members})
+
+    def get_buckets(self, keys: Iterable[str]) -> Dict[str, List[str]]:
+        conn = self._load_lsh()
+        buckets = _select_buckets(conn.cursor(), keys)
+        conn.close()
+        return buckets
+
+    def list_buckets(self) -> List[List[str]]:
+        conn = self._load_lsh()
+        buckets = _select_shared_buckets(conn.cursor())
+        conn.close()
+        return buckets
+
+    def query_rollups(self, start: Optional[str] = None, end: Optional[str] = None) -> List[tuple]:
+        rollups = self._load_derived(self.rollups_path)
+        if rollups is None:
+            rollups = self._load_derived(self.rollups_path, self._build_rollups, self._load_bugs())
+        result = []
+        for key, row in rollups["rows"].items():
+            day, severity, owner = key.split("|", 2)
+            if (start is None or day >= start) and (end is None or day <= end):
+                result.append((day, severity, owner, *row))
+        return sorted(result)
 
     def save_bug(self, bug: Bug):
         bugs = self._load_bugs()
+        previous = {bug.bug_id: bugs.get(bug.bug_id)}
         bugs[bug.bug_id] = bug.to_dict()
-        self._save_bugs(bugs)
+        self._save_bugs(bugs, previous)
+
+    def save_bugs(self, bugs: List[Bug], deleted: Iterable[str] = ()):
+        # Saves and deletes land in a single rewrite of the store and its sidecars
+        deleted = list(deleted)
+        if not bugs and not deleted:
+            return
+        data = self._load_bugs()
+        previous = {}
+        for bug in bugs:
+            previous.setdefault(bug.bug_id, data.get(bug.bug_id))
+            data[bug.bug_id] = bug.to_dict()
+        for bug_id in deleted:
+            if bug_id in data:
+                previous.setdefault(bug_id, data[bug_id])
+                del data[bug_id]
+        if previous:
+            self._save_bugs(data, previous)
 
     def get_bug(self, bug_id: str) -> Optional[Bug]:
         bugs = self._load_bugs()
         data = bugs.get(bug_id)
         return Bug.from_dict(data) if data else None
 
+    def get_bugs(self, bug_ids: Iterable[str]) -> List[Bug]:
+        index = self._load_derived(self.files_path)
+        if index is not None:
+            return self._read_records([bug_id for bug_id in bug_ids if bug_id in index["bugs"]], index)
+        bugs = self._load_bugs()
+        return [Bug.from_dict(bugs[bug_id]) for bug_id in bug_ids if bug_id in bugs]
+
+    def get_content_hashes(self) -> Dict[str, str]:
+        return {bug_id: content_hash(data) for bug_id, data in self._load_bugs().items()}
+
     def list_bugs(self) -> List[Bug]:
         bugs = self._load_bugs()
         return [Bug.from_dict(data) for data in bugs.values()]
 
     def delete_bug(self, bug_id: str):
+        self.save_bugs([], [bug_id])
+
+    def _read_records(self, bug_ids: List[str], index: dict) -> List[Bug]:
+        # Seeks to each record using the layout saved with the file index, parsing nothing else
+        layout = index.get("layout")
+        if bug_ids and layout is not None:
+            with open(self.file_path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if [stat.st_mtime_ns, stat.st_size] == index["source"]:
+                    def read(span):
+                        f.seek(span[0])
+                        return json.loads(f.read(span[1] - span[0]))
+
+                    spans = layout["records"]
+                    records = {bug_id: read(spans[bug_id]) for bug_id in sorted(set(bug_ids), key=lambda b: spans[b][0])}
+                    if layout["encoding"] == "compact":
+                        users = _Interner(read(layout["tables"]["users"]))
+                        fields = _Interner(read(layout["tables"]["fields"]))
+                        records = {bug_id: _decode_record(bug_id, p, users, fields) for bug_id, p in records.items()}
+                    return [Bug.from_dict(records[bug_id]) for bug_id in bug_ids]
+        bugs = self._load_bugs() if bug_ids else {}
+        return [Bug.from_dict(bugs[bug_id]) for bug_id in bug_ids if bug_id in bugs]
+
+    def find_by_location(self, file_key: str, start_line: Optional[int] = None,
+                         end_line: Optional[int] = None, recursive: bool = False) -> List[Bug]:
+        bugs = None
+        index = self._load_derived(self.files_path)
+        if index is None:
+            bugs = self._load_bugs()
+            index = self._load_derived(self.files_path, self._build_file_index, bugs)
+        files = index["files"]
+        if recursive:
+            keys = list(files)
+            lo, hi = prefix_bounds(file_key)
+            selected = keys[bisect_left(keys, lo):bisect_left(keys, hi)]
+            # The root key "" already falls inside its own bounds
+            if file_key and file_key in files:
+                selected.insert(0, file_key)
+            bug_ids = [bug_id for key in selected for _, bug_id in files[key]]
+        else:
+            entries = files.get(file_key, [])
+            lo = bisect_left(entries, [start_line, ""]) if start_line is not None else 0
+            hi = bisect_left(entries, [end_line + 1, ""]) if end_line is not None else len(entries)
+            bug_ids = [bug_id for _, bug_id in entries[lo:hi]]
+        if bugs is not None:
+            return [Bug.from_dict(bugs[bug_id]) for bug_id in bug_ids]
+        return self._read_records(bug_ids, index)
+
+    def compact_storage(self):
         bugs = self._load_bugs()
-        if bug_id in bugs:
-            del bugs[bug_id]
-            self._save_bugs(bugs)
+        self._save_bugs(bugs)
+
+    def _load_view_defs(self) -> dict:
+        if self.filters_path.exists():
+            return self._load_sidecar(self.filters_path)
+        # Stores from before the split kept the definitions inside the views sidecar
+        legacy = self._load_sidecar(self.views_path).get("views")
+        if not legacy:
+            return {}
+        defs = {name: {"filters": view["filters"], "watched": view.get("watched")} for name, view in legacy.items()}
+        self._save_sidecar(self.filters_path, defs)
+        self.views_path.unlink()
+        return defs
+
+    def save_view(self, name: str, filters: Dict[str, str]):
+        defs = self._load_view_defs()
+        defs[name] = {"filters": filters, "watched": defs.get(name, {}).get("watched")}
+        self._save_sidecar(self.filters_path, defs)
+        bugs = self._load_bugs()
+        views = self._load_derived(self.views_path)
+        if views is None or set(views["members"]) - {name} != set(defs) - {name}:
+            views = self._build_views(bugs, {})
+        else:
+            views["members"][name] = sorted(
+                bug_id for bug_id, data in bugs.items() if bug_matches(Bug.from_dict(data), **filters)
+            )
+        self._write_derived(self.views_path, views)
+
+    def get_view(self, name: str) -> Optional[dict]:
+        defs = self._load_view_defs()
+        if name not in defs:
+            return None
+        views = self._load_derived(self.views_path)
+        if views is None or set(views["members"]) != set(defs):
+            views = self._build_views(self._load_bugs(), {})
+            self._write_derived(self.views_path, views)
+        return {**defs[name], "members": views["members"][name]}
+
+    def set_view_watched(self, name: str, members: List[str]):
+        defs = self._load_view_defs()
+        if name in defs:
+            defs[name]["watched"] = sorted(members)
+            self._save_sidecar(self.filters_path, defs)
+
+    def _load_sidecar(self, path: Path) -> dict:
+        if not path.exists():
+            return {}
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _save_sidecar(self, path: Path, data: dict):
+        raw = json.dumps(data, indent=4).encode("utf-8")
+        atomic_write(path, lambda f: f.write(raw))
+
+    def get_meta(self, key: str) -> Optional[str]:
+        return self._load_sidecar(self.meta_path).get(key)
+
+    def set_meta(self, key: str, value: Optional[str]):
+        meta = self._load_sidecar(self.meta_path)
+        meta[key] = value
+        self._save_sidecar(self.meta_path, meta)
+
+    def add_commit_links(self, links: List[Dict[str, str]]):
+        if not links:
+            return
+        index = self._load_sidecar(self.commits_path)
+        for link in links:
+            entries = index.setdefault(link["bug_id"], [])
+            if not any(e["sha"] == link["sha"] for e in entries):
+                entries.append({k: v for k, v in link.items() if k != "bug_id"})
+        self._save_sidecar(self.commits_path, index)
+
+    def get_commit_links(self, bug_id: str) -> List[Dict[str, str]]:
+        entries = self._load_sidecar(self.commits_path).get(bug_id, [])
+        return [{"bug_id": bug_id, **e} for e in entries]
+
+    def get_indexed_commits(self, shas: Iterable[str]) -> set:
+        shas = set(shas)
+        index = self._load_sidecar(self.commits_path)
+        return {e["sha"] for entries in index.values() for e in entries if e["sha"] in shas}
 
 class SQLiteStorage(BugStorage):
     def __init__(self, db_path: Path):
@@ -81,21 +720,99 @@ class SQLiteStorage(BugStorage):
                 created TEXT,
                 resolved TEXT,
                 comments TEXT,
-                history TEXT
+                history TEXT,
+                commit_sha TEXT,
+                file_key TEXT,
+                content_hash TEXT
+            )
+        ''')
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(bugs)')]
+        if "commit_sha" not in columns:
+            cursor.execute('ALTER TABLE bugs ADD COLUMN commit_sha TEXT')
+        if "file_key" not in columns:
+            cursor.execute('ALTER TABLE bugs ADD COLUMN file_key TEXT')
+            rows = cursor.execute('SELECT bug_id, file FROM bugs').fetchall()
+            cursor.executemany('UPDATE bugs SET file_key = ? WHERE bug_id = ?',
+                               [(normalize_path(file or ""), bug_id) for bug_id, file in rows])
+        if "content_hash" not in columns:
+            cursor.execute('ALTER TABLE bugs ADD COLUMN content_hash TEXT')
+            cursor.execute('SELECT * FROM bugs')
+            cursor.executemany('UPDATE bugs SET content_hash = ? WHERE bug_id = ?',
+                               [(content_hash(bug.to_dict()), bug.bug_id) for bug in map(self._row_to_bug, cursor.fetchall())])
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bugs_file_line ON bugs (file_key, line)')
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'rollups'")
+        backfill_rollups = cursor.fetchone() is None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rollups (
+                day TEXT,
+                severity TEXT,
+                owner TEXT,
+                opened INTEGER DEFAULT 0,
+                resolved INTEGER DEFAULT 0,
+                reopened INTEGER DEFAULT 0,
+                moved_in INTEGER DEFAULT 0,
+                moved_out INTEGER DEFAULT 0,
+                resolve_seconds INTEGER DEFAULT 0,
+                PRIMARY KEY (day, severity, owner)
+            )
+        ''')
+        if backfill_rollups:
+            cursor.execute('SELECT * FROM bugs')
+            self._update_rollups(cursor, [], [self._row_to_bug(row).to_dict() for row in cursor.fetchall()])
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        cursor.execute("SELECT value FROM meta WHERE key = 'minhash_version'")
+        row = cursor.fetchone()
+        if row is None or row[0] != str(minhash.VERSION):
+            # Signatures from another MinHash version are not comparable, so the index is rebuilt
+            cursor.execute('DROP TABLE IF EXISTS minhash')
+            cursor.execute('DROP TABLE IF EXISTS lsh_buckets')
+            _create_lsh_tables(cursor)
+            cursor.execute('SELECT bug_id, desc FROM bugs')
+            _update_lsh_tables(cursor, {}, dict(cursor.fetchall()))
+            cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('minhash_version', ?)", (str(minhash.VERSION),))
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS views (
+                name TEXT PRIMARY KEY,
+                filters TEXT,
+                watched TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS view_members (
+                name TEXT,
+                bug_id TEXT,
+                PRIMARY KEY (name, bug_id)
             )
         ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS commit_links (
+                sha TEXT,
+                bug_id TEXT,
+                action TEXT,
+                author TEXT,
+                date TEXT,
+                summary TEXT,
+                PRIMARY KEY (sha, bug_id)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_commit_links_bug ON commit_links (bug_id)')
         conn.commit()
         conn.close()
 
-    def save_bug(self, bug: Bug):
-        data = bug.to_dict()
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
+    _INSERT_SQL = '''
             INSERT OR REPLACE INTO bugs 
-            (bug_id, desc, file, line, tags, severity, status, owner, due_date, created, resolved, comments, history)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+            (bug_id, desc, file, line, tags, severity, status, owner, due_date, created, resolved, comments, history, commit_sha, file_key, content_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        '''
+
+    def _bug_to_row(self, bug: Bug) -> tuple:
+        data = bug.to_dict()
+        return (
             data["bug_id"],
             data["desc"],
             data["file"],
@@ -108,8 +825,84 @@ class SQLiteStorage(BugStorage):
             data["created"],
             data["resolved"],
             json.dumps(data["comments"]),
-            json.dumps(data["history"])
-        ))
+            json.dumps(data["history"]),
+            data["commit"],
+            normalize_path(data["file"]),
+            content_hash(data)
+        )
+
+    def _update_views(self, cursor, bugs: List[Bug], deleted: Iterable[str] = ()):
+        # View membership is kept in the same transaction as the bug write
+        deleted = list(deleted)
+        for name, filters in cursor.execute('SELECT name, filters FROM views').fetchall():
+            filters = json.loads(filters)
+            matches = {b.bug_id: bug_matches(b, **filters) for b in bugs}
+            cursor.executemany('INSERT OR IGNORE INTO view_members (name, bug_id) VALUES (?, ?)',
+                               [(name, bug_id) for bug_id, hit in matches.items() if hit])
+            cursor.executemany('DELETE FROM view_members WHERE name = ? AND bug_id = ?',
+                               [(name, bug_id) for bug_id, hit in matches.items() if not hit] +
+                               [(name, bug_id) for bug_id in deleted])
+
+    def _stored_dicts(self, cursor, bug_ids: List[str]) -> List[dict]:
+        rows = []
+        for i in range(0, len(bug_ids), 500):
+            chunk = bug_ids[i:i + 500]
+            cursor.execute(f'SELECT * FROM bugs WHERE bug_id IN ({",".join("?" * len(chunk))})', chunk)
+            rows.extend(cursor.fetchall())
+        return [self._row_to_bug(row).to_dict() for row in rows]
+
+    def _update_rollups(self, cursor, old: List[dict], new: List[dict]):
+        # Subtract the replay of each bug's stored version and add the new one
+        deltas: Dict[tuple, list] = {}
+        for sign, versions in [(-1, old), (1, new)]:
+            for data in versions:
+                for key, values in bug_rollup_events(data).items():
+                    row = deltas.setdefault(key, [0] * len(ROLLUP_METRICS))
+                    for i, value in enumerate(values):
+                        row[i] += sign * value
+        columns = ", ".join(ROLLUP_METRICS)
+        updates = ", ".join(f"{m} = {m} + excluded.{m}" for m in ROLLUP_METRICS)
+        cursor.executemany(f'''
+            INSERT INTO rollups (day, severity, owner, {columns})
+            VALUES (?, ?, ?, {", ".join("?" * len(ROLLUP_METRICS))})
+            ON CONFLICT(day, severity, owner) DO UPDATE SET {updates}
+        ''', [(*key, *values) for key, values in deltas.items() if any(values)])
+
+    def _bump_generation(self, cursor):
+        # The random id tells apart two copies of the store that reached the same count
+        cursor.execute('''
+            INSERT INTO meta (key, value) VALUES ('generation', '1')
+            ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+        ''')
+        cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation_id', ?)",
+                       (str(random.getrandbits(62)),))
+
+    def get_generation(self) -> Tuple[int, int]:
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT key, value FROM meta WHERE key IN ('generation', 'generation_id')")
+        values = dict(cursor.fetchall())
+        conn.close()
+        return int(values.get("generation", 0)), int(values.get("generation_id", 0))
+
+    def save_bug(self, bug: Bug):
+        self.save_bugs([bug])
+
+    def save_bugs(self, bugs: List[Bug], deleted: Iterable[str] = ()):
+        deleted = list(deleted)
+        if not bugs and not deleted:
+            return
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        old = self._stored_dicts(cursor, list({bug.bug_id for bug in bugs} | set(deleted)))
+        cursor.executemany(self._INSERT_SQL, [self._bug_to_row(bug) for bug in bugs])
+        cursor.executemany('DELETE FROM bugs WHERE bug_id = ?', [(bug_id,) for bug_id in deleted])
+        self._update_views(cursor, bugs, deleted)
+        latest = {b.bug_id: b for b in bugs if b.bug_id not in deleted}
+        self._update_rollups(cursor, old, [bug.to_dict() for bug in latest.values()])
+        _update_lsh_tables(cursor, {data["bug_id"]: data["desc"] for data in old},
+                           {bug_id: bug.desc for bug_id, bug in latest.items()})
+        self._bump_generation(cursor)
         conn.commit()
         conn.close()
 
@@ -132,9 +925,183 @@ class SQLiteStorage(BugStorage):
         return [self._row_to_bug(row) for row in rows]
 
     def delete_bug(self, bug_id: str):
+        self.save_bugs([], [bug_id])
+
+    def get_meta(self, key: str) -> Optional[str]:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM bugs WHERE bug_id = ?', (bug_id,))
+        cursor.execute('SELECT value FROM meta WHERE key = ?', (key,))
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: Optional[str]):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+        conn.commit()
+        conn.close()
+
+    def add_commit_links(self, links: List[Dict[str, str]]):
+        if not links:
+            return
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT OR IGNORE INTO commit_links (sha, bug_id, action, author, date, summary)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [
+            (l["sha"], l["bug_id"], l["action"], l["author"], l["date"], l["summary"])
+            for l in links
+        ])
+        conn.commit()
+        conn.close()
+
+    def get_commit_links(self, bug_id: str) -> List[Dict[str, str]]:
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT sha, bug_id, action, author, date, summary FROM commit_links WHERE bug_id = ? ORDER BY date',
+            (bug_id,)
+        )
+        rows = cursor.fetchall()
+        conn.close()
+        keys = ["sha", "bug_id", "action", "author", "date", "summary"]
+        return [dict(zip(keys, row)) for row in rows]
+
+    def get_indexed_commits(self, shas: Iterable[str]) -> set:
+        shas = list(shas)
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        indexed = set()
+        for i in range(0, len(shas), 500):
+            chunk = shas[i:i + 500]
+            cursor.execute(f'SELECT DISTINCT sha FROM commit_links WHERE sha IN ({",".join("?" * len(chunk))})', chunk)
+            indexed.update(row[0] for row in cursor.fetchall())
+        conn.close()
+        return indexed
+
+    def find_by_location(self, file_key: str, start_line: Optional[int] = None,
+                         end_line: Optional[int] = None, recursive: bool = False) -> List[Bug]:
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        if recursive:
+            lo, hi = prefix_bounds(file_key)
+            cursor.execute(
+                'SELECT * FROM bugs WHERE file_key = ? OR (file_key >= ? AND file_key < ?) ORDER BY file_key, line, bug_id',
+                (file_key, lo, hi)
+            )
+        else:
+            cursor.execute(
+                'SELECT * FROM bugs WHERE file_key = ? AND line >= ? AND line <= ? ORDER BY line, bug_id',
+                (file_key,
+                 start_line if start_line is not None else -2**31,
+                 end_line if end_line is not None else 2**31 - 1)
+            )
+        rows = cursor.fetchall()
+        conn.close()
+        return [self._row_to_bug(row) for row in rows]
+
+    def compact_storage(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('VACUUM')
+        conn.close()
+
+    def get_bugs(self, bug_ids: Iterable[str]) -> List[Bug]:
+        bug_ids = list(bug_ids)
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        rows = []
+        for i in range(0, len(bug_ids), 500):
+            chunk = bug_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            cursor.execute(f'SELECT * FROM bugs WHERE bug_id IN ({placeholders})', chunk)
+            rows.extend(cursor.fetchall())
+        conn.close()
+        return [self._row_to_bug(row) for row in rows]
+
+    def get_signatures(self, bug_ids: Optional[Iterable[str]] = None) -> Dict[str, List[int]]:
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        signatures = _select_signatures(cursor, bug_ids)
+        conn.close()
+        return signatures
+
+    def get_content_hashes(self) -> Dict[str, str]:
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT bug_id, content_hash FROM bugs')
+        rows = cursor.fetchall()
+        conn.close()
+        return dict(rows)
+
+    def find_bucket_candidates(self, keys: List[str]) -> List[str]:
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT DISTINCT bug_id FROM lsh_buckets WHERE bucket IN ({",".join("?" * len(keys))}) ORDER BY bug_id', keys)
+        rows = cursor.fetchall()
+        conn.close()
+        return [row[0] for row in rows]
+
+    def get_buckets(self, keys: Iterable[str]) -> Dict[str, List[str]]:
+        conn = sqlite3.connect(self.db_path)
+        buckets = _select_buckets(conn.cursor(), keys)
+        conn.close()
+        return buckets
+
+    def list_buckets(self) -> List[List[str]]:
+        conn = sqlite3.connect(self.db_path)
+        buckets = _select_shared_buckets(conn.cursor())
+        conn.close()
+        return buckets
+
+    def query_rollups(self, start: Optional[str] = None, end: Optional[str] = None) -> List[tuple]:
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT day, severity, owner, {", ".join(ROLLUP_METRICS)} FROM rollups
+            WHERE day >= ? AND day <= ? ORDER BY day, severity, owner
+        ''', (start or "", end or "9999-99-99"))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+    def save_view(self, name: str, filters: Dict[str, str]):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO views (name, filters) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET filters = excluded.filters
+        ''', (name, json.dumps(filters)))
+        cursor.execute('DELETE FROM view_members WHERE name = ?', (name,))
+        cursor.execute('SELECT * FROM bugs')
+        members = [bug.bug_id for bug in map(self._row_to_bug, cursor.fetchall()) if bug_matches(bug, **filters)]
+        cursor.executemany('INSERT INTO view_members (name, bug_id) VALUES (?, ?)',
+                           [(name, bug_id) for bug_id in members])
+        conn.commit()
+        conn.close()
+
+    def get_view(self, name: str) -> Optional[dict]:
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT filters, watched FROM views WHERE name = ?', (name,))
+        row = cursor.fetchone()
+        if not row:
+            conn.close()
+            return None
+        cursor.execute('SELECT bug_id FROM view_members WHERE name = ? ORDER BY bug_id', (name,))
+        members = [r[0] for r in cursor.fetchall()]
+        conn.close()
+        return {
+            "filters": json.loads(row[0]),
+            "members": members,
+            "watched": json.loads(row[1]) if row[1] is not None else None
+        }
+
+    def set_view_watched(self, name: str, members: List[str]):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('UPDATE views SET watched = ? WHERE name = ?', (json.dumps(sorted(members)), name))
         conn.commit()
         conn.close()
 
@@ -152,5 +1119,54 @@ class SQLiteStorage(BugStorage):
             "created": row[9],
             "resolved": row[10],
             "comments": json.loads(row[11]),
-            "history": json.loads(row[12])
+            "history": json.loads(row[12]),
+            "commit": row[13]
         })
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+def open_store(path: Path) -> Optional[BugStorage]:
+    # Picks the backend from the file contents, so git's suffix-less temp files work too
+    if not path.exists() or path.stat().st_size == 0:
+        return None
+    with open(path, 'rb') as f:
+        magic = f.read(len(SQLITE_MAGIC))
+    if magic == SQLITE_MAGIC:
+        return SQLiteStorage(path)
+    return JSONStorage(path)
+
+def merge_stores(target: BugStorage, other: BugStorage, base: Optional[BugStorage] = None) -> Dict[str, int]:
+    # Only bugs whose content hash differs from the target's are loaded and merged
+    ours = target.get_content_hashes()
+    theirs = other.get_content_hashes()
+    base_hashes = base.get_content_hashes() if base else {}
+    changed = [bug_id for bug_id, digest in theirs.items() if ours.get(bug_id) != digest]
+
+    # Without a common base a missing bug is simply new; with one, it may have been deleted
+    deleted = [
+        bug_id for bug_id in ours
+        if bug_id not in theirs and bug_id in base_hashes and ours[bug_id] == base_hashes[bug_id]
+    ]
+    our_bugs = {bug.bug_id: bug for bug in target.get_bugs([i for i in changed if i in ours])}
+    their_bugs = {bug.bug_id: bug for bug in other.get_bugs(changed)}
+    base_bugs = {bug.bug_id: bug for bug in base.get_bugs([i for i in changed if i in base_hashes])} if base else {}
+
+    to_save = []
+    stats = {"added": 0, "updated": 0, "deleted": 0, "unchanged": len(theirs) - len(changed)}
+    for bug_id in changed:
+        theirs_bug = their_bugs[bug_id]
+        if bug_id not in our_bugs:
+            if bug_id in base_hashes and theirs[bug_id] == base_hashes[bug_id]:
+                continue
+            to_save.append(theirs_bug)
+            stats["added"] += 1
+            continue
+        merged = our_bugs[bug_id].merge(theirs_bug, base_bugs.get(bug_id))
+        if content_hash(merged.to_dict()) != content_hash(our_bugs[bug_id].to_dict()):
+            to_save.append(merged)
+            stats["updated"] += 1
+        else:
+            stats["unchanged"] += 1
+    target.save_bugs(to_save, deleted)
+    stats["deleted"] = len(deleted)
+    return stats
@@ -1,15 +1,154 @@
+import ast
 import json
 import csv
 import re
 import os
+import posixpath
 import shutil
 import subprocess
+import tempfile
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
 from .models import Bug
 from .constants import Status, Severity
 from datetime import datetime, timedelta
 
+EPOCH = datetime(1970, 1, 1)
+
+def iso_to_micros(timestamp: str) -> int:
+    dt = datetime.fromisoformat(timestamp)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+def micros_to_iso(value: int) -> str:
+    return (EPOCH + timedelta(microseconds=value)).isoformat()
+
+def normalize_path(path: str, project_root: Optional[Path] = None) -> str:
+    if project_root is not None and os.path.isabs(path):
+        try:
+            path = os.path.relpath(path, project_root)
+        except ValueError:
+            pass
+    path = posixpath.normpath(path.replace("\\", "/"))
+    return "" if path == "." else path
+
+def prefix_bounds(directory: str) -> Tuple[str, str]:
+    # Keys under "dir/" sort in ["dir/", "dir0") since "0" follows "/"
+    if not directory:
+        return "", "\U0010ffff"
+    return directory + "/", directory + "0"
+
+FILTER_FIELDS = ("tag", "file", "status", "severity", "search")
+
+def bug_matches(bug: Bug, tag=None, file=None, status=None, severity=None, search=None) -> bool:
+    if tag and tag not in bug.tags:
+        return False
+    if file and normalize_path(file) != normalize_path(bug.file):
+        return False
+    if status and status != bug.status:
+        return False
+    if severity and severity != bug.severity:
+        return False
+    if search:
+        try:
+            if not re.search(search, bug.desc, re.IGNORECASE):
+                return False
+        except re.error:
+            if search.lower() not in bug.desc.lower():
+                return False
+    return True
+
+def sort_bugs(bugs: List[Bug], sort_by: str = "date") -> List[Bug]:
+    if sort_by == "severity":
+        severity_order = {Severity.CRITICAL: 0, Severity.MAJOR: 1, Severity.MINOR: 2}
+        bugs.sort(key=lambda b: severity_order.get(b.severity, 3))
+    elif sort_by == "status":
+        status_order = {Status.OPEN: 0, Status.IN_PROGRESS: 1, Status.RESOLVED: 2, Status.CLOSED: 3}
+        bugs.sort(key=lambda b: status_order.get(b.status, 4))
+    elif sort_by == "file":
+        bugs.sort(key=lambda b: (b.file, b.line))
+    else: # date
+        bugs.sort(key=lambda b: b.created, reverse=True)
+    return bugs
+
+ROLLUP_METRICS = ("opened", "resolved", "reopened", "moved_in", "moved_out", "resolve_seconds")
+CLOSED_STATUSES = (Status.RESOLVED, Status.CLOSED)
+
+def _enum_or_none(enum, value):
+    try:
+        return enum(value)
+    except ValueError:
+        return None
+
+def bug_rollup_events(data: Dict[str, Any]) -> Dict[Tuple[str, str, str], List[float]]:
+    # Replays one bug's history into per (day, severity, owner) metric vectors.
+    # Rollups are the sum over all bugs, so a write only has to subtract the
+    # previous replay of the changed bug and add the new one.
+    rows: Dict[Tuple[str, str, str], List[float]] = {}
+
+    def emit(timestamp, severity, owner, metric, amount=1):
+        key = (timestamp[:10], severity.value, owner or "")
+        row = rows.setdefault(key, [0] * len(ROLLUP_METRICS))
+        row[ROLLUP_METRICS.index(metric)] += amount
+
+    tracked = {"status": Status, "severity": Severity, "owner": None}
+    history = [h for h in data.get("history", []) if h["field"] in tracked]
+    state = {
+        "status": Status(data.get("status", Status.OPEN)),
+        "severity": Severity(data.get("severity", Severity.MAJOR)),
+        "owner": data.get("owner")
+    }
+    current = dict(state)
+    for h in reversed(history):
+        enum = tracked[h["field"]]
+        value = _enum_or_none(enum, h["old_value"]) if enum else h["old_value"]
+        if not enum or value is not None:
+            state[h["field"]] = value
+
+    created = data["created"]
+    opened_at = created
+    emit(created, state["severity"], state["owner"], "opened")
+    if state["status"] in CLOSED_STATUSES:
+        emit(created, state["severity"], state["owner"], "resolved")
+
+    def transition(timestamp, field, value):
+        nonlocal opened_at
+        was_closed = state["status"] in CLOSED_STATUSES
+        if field == "status":
+            is_closed = value in CLOSED_STATUSES
+            if is_closed and not was_closed:
+                emit(timestamp, state["severity"], state["owner"], "resolved")
+                try:
+                    seconds = (datetime.fromisoformat(timestamp) - datetime.fromisoformat(opened_at)).total_seconds()
+                except (TypeError, ValueError):
+                    seconds = 0
+                emit(timestamp, state["severity"], state["owner"], "resolve_seconds", max(int(seconds), 0))
+            elif was_closed and not is_closed:
+                emit(timestamp, state["severity"], state["owner"], "reopened")
+                opened_at = timestamp
+        elif not was_closed and value != state[field]:
+            emit(timestamp, state["severity"], state["owner"], "moved_out")
+            moved = {**state, field: value}
+            emit(timestamp, moved["severity"], moved["owner"], "moved_in")
+        state[field] = value
+
+    last_timestamp = created
+    for h in history:
+        enum = tracked[h["field"]]
+        value = _enum_or_none(enum, h["new_value"]) if enum else h["new_value"]
+        if enum and value is None:
+            continue
+        last_timestamp = max(last_timestamp, h["timestamp"])
+        transition(h["timestamp"], h["field"], value)
+
+    # Folded or hand-edited history can leave the replay short of the stored state
+    for field in ["severity", "owner", "status"]:
+        if state[field] != current[field]:
+            timestamp = data.get("resolved") if field == "status" and current[field] in CLOSED_STATUSES else None
+            transition(timestamp or last_timestamp, field, current[field])
+    return rows
+
 def export_bugs(bugs: List[Bug], format: str, output_path: Path):
     if format == "json":
         data = [b.to_dict() for b in bugs]
@@ -44,6 +183,22 @@ def import_bugs(input_path: Path) -> List[Bug]:
         return [Bug.from_dict(d) for d in data]
     return []
 
+def atomic_write(path: Path, write: Callable[[Any], None]):
+    # Every writer gets its own temp file beside `path`, so concurrent writers never share one
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        if path.exists():
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
 def create_backup(data_dir: Path):
     backup_dir = data_dir / "backups"
     backup_dir.mkdir(exist_ok=True)
@@ -56,15 +211,23 @@ def create_backup(data_dir: Path):
     while len(all_backups) > 10:
         all_backups.pop(0).unlink()
 
+HOOK_COMMAND = "bugmark link-commits --quiet || true"
+
 def install_git_hook(project_root: Path):
     git_dir = project_root / ".git"
     if not git_dir.exists():
         return False, "Not a git repository."
     hooks_dir = git_dir / "hooks"
-    hook_path = hooks_dir / "prepare-commit-msg"
-    hook_content = """#!/bin/sh
+    hooks_dir.mkdir(exist_ok=True)
+    hook_path = hooks_dir / "post-commit"
+    if hook_path.exists():
+        if HOOK_COMMAND in hook_path.read_text(errors="replace"):
+            return True, "Hook already installed."
+        # Someone else's hook: leave it alone rather than guess where our line belongs
+        return False, f"A post-commit hook already exists at {hook_path}; add this line to it: {HOOK_COMMAND}"
+    hook_content = f"""#!/bin/sh
 # Bugmark hook to auto-link bugs to commits
-COMMIT_MSG_FILE=$1
+{HOOK_COMMAND}
 """
     with open(hook_path, "w") as f:
         f.write(hook_content)
@@ -72,6 +235,201 @@ COMMIT_MSG_FILE=$1
         os.chmod(hook_path, 0o755)
     return True, "Hook installed."
 
+def install_merge_driver(project_root: Path, data_file: Path):
+    if not (project_root / ".git").exists():
+        return False, "Not a git repository."
+    subprocess.run(["git", "config", "merge.bugmark.name", "bugmark per-bug store merge"], cwd=project_root, check=True)
+    subprocess.run(["git", "config", "merge.bugmark.driver", "bugmark merge-driver %O %A %B"], cwd=project_root, check=True)
+    try:
+        pattern = data_file.resolve().relative_to(project_root.resolve()).as_posix()
+    except ValueError:
+        return True, "Merge driver configured (data file is outside the repository, no .gitattributes entry added)."
+    attributes = project_root / ".gitattributes"
+    line = f"{pattern} merge=bugmark"
+    existing = attributes.read_text().splitlines() if attributes.exists() else []
+    if line not in existing:
+        with open(attributes, "a") as f:
+            if existing and existing[-1] != "":
+                f.write("\n")
+            f.write(line + "\n")
+    return True, "Merge driver configured."
+
+BUG_REF_PATTERN = re.compile(r"(?:\b(fix(?:es|ed)?|close[sd]?|resolve[sd]?|refs?)\b[:\s]*)?#(\d+)\b", re.IGNORECASE)
+
+def parse_bug_refs(message: str) -> List[Tuple[str, str]]:
+    refs = {}
+    for match in BUG_REF_PATTERN.finditer(message):
+        verb = (match.group(1) or "").lower()
+        if verb.startswith(("fix", "resolve")):
+            action = "fixes"
+        elif verb.startswith("close"):
+            action = "closes"
+        else:
+            action = "refs"
+        bug_id = match.group(2)
+        if refs.get(bug_id, "refs") == "refs":
+            refs[bug_id] = action
+    return list(refs.items())
+
+def iter_git_commits(project_root: Path, since: Optional[str] = None) -> Iterator[Dict[str, str]]:
+    # One `git log` stream, oldest first; fields split by \x1f, records by \x1e
+    rev_range = f"{since}..HEAD" if since else "HEAD"
+    proc = subprocess.Popen(
+        ["git", "log", "--reverse", "--format=%H%x1f%an%x1f%aI%x1f%B%x1e", rev_range],
+        cwd=project_root, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        text=True, encoding="utf-8", errors="replace"
+    )
+    buffer = ""
+    try:
+        while True:
+            chunk = proc.stdout.read(65536)
+            if not chunk:
+                break
+            buffer += chunk
+            *records, buffer = buffer.split("\x1e")
+            for record in records:
+                record = record.lstrip("\n")
+                if record:
+                    sha, author, date, message = record.split("\x1f", 3)
+                    yield {"sha": sha, "author": author, "date": date, "message": message.strip()}
+    finally:
+        proc.stdout.close()
+        proc.wait()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, "git log")
+
+def git_merge_base(project_root: Path, sha: str) -> Optional[str]:
+    # None when `sha` is unknown (e.g. garbage-collected after a rebase) or unrelated to HEAD
+    result = subprocess.run(
+        ["git", "merge-base", sha, "HEAD"],
+        cwd=project_root, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() or None
+
+def is_git_ancestor(project_root: Path, ancestor: str, sha: str) -> bool:
+    result = subprocess.run(
+        ["git", "merge-base", "--is-ancestor", ancestor, sha],
+        cwd=project_root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return result.returncode == 0
+
+def local_datetime(timestamp: str) -> datetime:
+    # Commit dates carry an offset while bug timestamps are naive local time
+    value = datetime.fromisoformat(timestamp)
+    return value.astimezone().replace(tzinfo=None) if value.tzinfo else value
+
+def get_git_head(project_root: Path) -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=project_root,
+            capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip() or None
+
+def git_commit_before(project_root: Path, timestamp: str) -> Optional[str]:
+    result = subprocess.run(
+        ["git", "rev-list", "-1", f"--before={timestamp}", "HEAD"],
+        cwd=project_root, capture_output=True, text=True
+    )
+    return result.stdout.strip() or None
+
+HUNK_PATTERN = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+def _git_diff(project_root: Path, *args: str) -> str:
+    result = subprocess.run(
+        ["git", "-c", "core.quotePath=false", "diff", "-M", "--relative", "--no-color", "--no-ext-diff", *args],
+        cwd=project_root, capture_output=True, text=True, encoding="utf-8", errors="replace"
+    )
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, "git diff", stderr=result.stderr)
+    return result.stdout
+
+def _unquote_path(path: str) -> str:
+    # git C-quotes paths holding control characters, quotes or backslashes
+    return ast.literal_eval(path) if path.startswith('"') else path
+
+def _diff_path(path: str) -> Optional[str]:
+    # ---/+++ paths carry an a/ or b/ prefix, and a trailing tab when they contain spaces
+    path = path.rstrip("\t")
+    if path == "/dev/null":
+        return None
+    return _unquote_path(path)[2:]
+
+def git_diff_files(project_root: Path, base: str, paths: List[str]) -> Dict[str, Tuple[Optional[str], List[Tuple[int, int, int, int]]]]:
+    # Maps each changed path (as of `base`) to its path at HEAD, None if deleted, and its
+    # (old_start, old_count, new_start, new_count) hunks. Unchanged paths are left out.
+    wanted = set(paths)
+    # Renames are only paired when both sides are in the pathspec, so find the new names first
+    fields = _git_diff(project_root, "--name-status", "-z", base, "HEAD").split("\0")
+    pathspec = set()
+    i = 0
+    while i < len(fields) - 1:
+        status = fields[i]
+        if status[:1] in ("R", "C"):
+            old, new = fields[i + 1], fields[i + 2]
+            i += 3
+        else:
+            old = new = fields[i + 1]
+            i += 2
+        if old in wanted:
+            pathspec.update([old, new])
+    if not pathspec:
+        return {}
+
+    files = {}
+    old = new = None
+    hunks: List[Tuple[int, int, int, int]] = []
+
+    def flush():
+        if old in wanted:
+            files[old] = (new, hunks)
+
+    for line in _git_diff(project_root, "-U0", base, "HEAD", "--", *sorted(pathspec)).splitlines():
+        if line.startswith("diff --git "):
+            flush()
+            old = new = None
+            hunks = []
+        elif line.startswith("rename from "):
+            old = _unquote_path(line[len("rename from "):])
+        elif line.startswith("rename to "):
+            new = _unquote_path(line[len("rename to "):])
+        elif line.startswith("--- "):
+            old = _diff_path(line[4:]) or old
+        elif line.startswith("+++ "):
+            new = _diff_path(line[4:])
+        else:
+            match = HUNK_PATTERN.match(line)
+            if match:
+                old_start, old_count, new_start, new_count = match.groups()
+                hunks.append((
+                    int(old_start), int(old_count) if old_count is not None else 1,
+                    int(new_start), int(new_count) if new_count is not None else 1
+                ))
+    flush()
+    return files
+
+def remap_line(line: int, hunks: List[Tuple[int, int, int, int]]) -> Optional[int]:
+    offset = 0
+    for old_start, old_count, new_start, new_count in hunks:
+        if old_count == 0:
+            # Pure insertion after old_start
+            if line > old_start:
+                offset += new_count
+                continue
+            break
+        if line < old_start:
+            break
+        if line < old_start + old_count:
+            if new_count == 0:
+                return None
+            return new_start + min(line - old_start, new_count - 1)
+        offset += new_count - old_count
+    return line + offset
+
 def scan_for_todos(project_root: Path) -> List[Dict[str, Any]]:
     todos = []
     patterns = [r"TODO[:\s]+(.*)", r"FIXME[:\s]+(.*)"]
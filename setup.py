@@ -19,6 +19,9 @@ setup(
         "Operating System :: OS Independent",
     ],
     python_requires=">=3.9",
+    extras_require={
+        "zstd": ["zstandard"],
+    },
     entry_points={
         "console_scripts": [
             "bugmark=bugmark.bugmark:main",